@@ -19,20 +19,30 @@ How it works:
 
 2. Go through every pdf file in that directory (`process_pdf_dir`).
 
-3. For every file, open them as a raw string (`open_pdf`)
-   and give the string to Grobid (`process_pdf_stream`). Grobid outputs TEI
-   format XML files.
+3. For every file, open them as a binary file (`open_pdf`)
+   and stream it to Grobid (`process_pdf_stream`). Grobid outputs TEI
+   format XML files. By default only the header of the pdf is processed,
+   `--fulltext` processes the whole document. With `--pages` only the first
+   pages are sent, as the header is there.
 
-4. Take the TEI XML file and convert it to a record dictionary (`build_dicts`).
+4. Take the TEI XML file and convert it to a record (`build_dict`), a
+   `mapping.Record` with slotted `Author` and `Affiliation` objects.
 
-5. Take the dictionary and modify its key names to match with
-   MARC21 HEPRecord. Finally convert (`utils.legacy_export_as_marc`)
-   and print the dictionary to a MARCXML file (`build_marc_xml`).
+5. Take the record and map its fields to
+   MARC21 HEPRecord. Finally convert (`utils.export_as_marc`)
+   and print the dictionary to a MARCXML file (`build_marc_xmls`).
+   The records are also stored per cnum as dictionaries (`store`), so that
+   the MARCXML can be written again from them (`export_marc_xmls`).
 
 
 USAGE EXAMPLES: 
 $ python grobid_proceedings.py -i test/
 $ python grobid_proceedings.py -i /afs/cern.ch/project/inspire/uploads/library/moriond/for_grobid/C12-03-10 -p 2012
+$ python grobid_proceedings.py -i test/ -p 2012 -n 8
+$ python grobid_proceedings.py -b /afs/cern.ch/project/inspire/uploads/library/moriond/for_grobid -p 2012 -n 8
+$ python grobid_proceedings.py -i test/ -p 2013 --from-records
+$ python grobid_proceedings.py -b /afs/cern.ch/project/inspire/uploads/library/moriond/for_grobid -p 2012 -n 8 --watch
+$ python grobid_proceedings.py --serve=8060 -n 8
 
 """
 
@@ -42,131 +52,295 @@ from __future__ import absolute_import
 import sys
 import getopt
 import os
-import re
 
-import fnmatch
+import functools
 import json
 import logging
+import multiprocessing
+import threading
+import time
 
-import requests
+from six.moves import queue
 
 from grobid_proceedings import (
+    balancer,
+    cache,
+    client,
+    concurrency,
+    filenames,
+    manifest,
     mapping,
+    metrics,
+    scanner,
+    service,
+    splitter,
+    store,
     utils,
+    watcher,
+    writer,
     )
 
 #input_dir = "test/"
-#GROBID_HOST = "http://localhost:8080/"  # Local installation
-GROBID_HOST = "http://inspire-grobid.cern.ch:8080/"
-
-
-# Please remove whitespaces from filenames first.
-FILE_SEARCH_PATTERN = [
-    # Example: Pages_from_C88-01-23_15-24.pdf
-    ('cnum and page range with prefix but take only start page',
-     re.compile(r'^Pages_from_(C\d\d-\d\d-\d\d)[-_](\d+)\-\d+\.pdfa?$'),
-     ('773__w', '773__c')),
-    # Example: Pages_from_C75-03-02_101.pdf
-    ('cnum and page start with prefix with optional dot',
-     re.compile(r'^Pages_from_(C\d\d-\d\d-\d\d?.?\d)[-_](\d+)\.pdfa?$'),
-     ('773__w', '773__c')),
-    # Example: Pages_from_C88-03-06.1_79-89.pdf
-    ('cnum and page range with prefix but take only start page with optional dot',
-     re.compile(r'^Pages_from_(C\d\d-\d\d-\d\d?.?\d)[-_](\d+)\-\d+\.pdfa?$'),
-     ('773__w', '773__c')),
-    ## Example: C73-03-04_Proceedings.pdf
-    #('cnum with Proceedings suffixed with optional dot',
-     #re.compile(r'^(C\d\d-\d\d-\d\d?.?\d)[-_](Proceedings).pdfa?$'),
-     #('773__w', '980__a')),
-    ## Example: C73-03-04.pdf, this is also the Proceedings file
-    #('cnum with Proceedings suffixed with optional dot',
-     #re.compile(r'^(C\d\d-\d\d-\d\d?.?\d).pdfa?$'),
-     #('773__w', '980__a')),
-    # Example: anything.pdf
-    ('garbage',
-     re.compile(r'(?i)^(.+)\.pdfa?$'),
-     ('rec_garbage', ))
-    ]
-
-
-# Set up a logger
-logging.basicConfig(level=logging.DEBUG,
-                    filename="grobid.log",
-                    filemode="a+",
-                    format="%(asctime)-15s %(levelname)-8s %(message)s")
+# Shared by all the workers, see `client.GrobidClient` for the options, or
+# `balancer.GrobidBalancer` for several Grobid servers.
+GROBID = client.GrobidClient()
+# TEI results of already processed pdfs, None disables the cache.
+TEI_CACHE = None
+# Use `processFulltextDocument` instead of `processHeaderDocument`. This is
+# only needed for the references (999C5), which we don't use at the moment.
+FULLTEXT = False
+# Send only this many first pages of every pdf to Grobid, 0 sends everything.
+# The header is on the first pages; see `process_pdf_stream`.
+HEADER_PAGES = 0
+# Timings and counters of the current run, see `metrics.RunMetrics`.
+METRICS = metrics.RunMetrics()
+
+
 logger = logging.getLogger("Grobid proceedings")
-console = logging.StreamHandler()
-console.setLevel(logging.INFO)
-formatter = logging.Formatter('%(asctime)-12s: %(levelname)-5s %(message)s')
-console.setFormatter(formatter)
-logging.getLogger('').addHandler(console)
+
+
+def setup_logging():
+    """Log everything to grobid.log and INFO and above to the console.
+
+    Only done when run as a script, so that importing this module (e.g. in
+    `benchmark`) leaves the logging of the caller alone.
+    """
+    logging.basicConfig(level=logging.DEBUG,
+                        filename="grobid.log",
+                        filemode="a+",
+                        format="%(asctime)-15s %(levelname)-8s %(message)s")
+    console = logging.StreamHandler()
+    console.setLevel(logging.INFO)
+    formatter = logging.Formatter('%(asctime)-12s: %(levelname)-5s %(message)s')
+    console.setFormatter(formatter)
+    logging.getLogger('').addHandler(console)
 
 grobid_likes_not = []
 
-def parse_filename(pdf_file):
-    """Get cnum and page numbers from pdf filename."""
-    logger.info("Input file: " + pdf_file)
-    for (pattern_name, file_pattern, fields) in FILE_SEARCH_PATTERN:
-        search_result = file_pattern.search(pdf_file)
-        if search_result:
-            logger.debug('Recognised ' + pattern_name)
-            logger.debug(
-                "cnum: " + search_result.group(1) + " fpage:" + search_result.group(2))
-            return search_result.groups()
-    logger.warning('No known pattern for ' + pdf_file)
+def parse_filename(pdf_file, verbose=True):
+    """Get cnum and page numbers from pdf filename, see `filenames.classify`."""
+    if verbose:
+        logger.info("Input file: " + pdf_file)
+    parsed = filenames.classify(pdf_file)
+    if parsed.kind == filenames.UNKNOWN:
+        logger.warning('No known pattern for ' + pdf_file)
+    elif verbose:
+        logger.debug("Recognised %s, cnum: %s fpage: %s",
+                     parsed.kind, parsed.cnum, parsed.fpage)
+    return parsed
+
+def is_contribution(pdf_path):
+    """Return True if the file name has a cnum and a first page."""
+    if filenames.classify(os.path.basename(pdf_path)).kind == filenames.CONTRIBUTION:
+        return True
+    logger.warning("Skipping " + pdf_path + ", there is no cnum and first page "
+                   "in the file name")
+    return False
+
+def page_order(pdf_path):
+    """Sort key which orders pdf files by their first page."""
+    fpage = filenames.classify(os.path.basename(pdf_path)).fpage
+    if fpage:
+        return (int(fpage), pdf_path)
+    return (sys.maxsize, pdf_path)
 
 def open_pdf(pdf_file):
-    """Open one pdf file as a raw string."""
-    with open(pdf_file, "r") as pfile:
-        pdf_string = pfile.read()
-    return pdf_string
-
-def process_pdf_stream(pdf_file):
-    """Process a PDF file stream with Grobid, returning TEI XML results."""
-    response = requests.post(
-        url=os.path.join(GROBID_HOST, "processFulltextDocument"),
-        files={'input': open_pdf(pdf_file)}
-        )
+    """Open one pdf file for reading as a binary file object."""
+    return open(pdf_file, "rb")
+
+def process_pdf_stream(pdf_file, pdf_digest=None, keep_failures=True):
+    """Process a PDF file stream with Grobid, returning TEI XML results.
 
-    if response.status_code == 200:
-        return response.text
+    Only the header is processed unless `FULLTEXT` is set. With
+    `HEADER_PAGES`, only the first pages are sent, and the whole pdf only if
+    Grobid finds no title or authors in them. Results are looked up from and
+    stored to `TEI_CACHE`, if it is set, by `pdf_digest` or else the digest
+    of the file. Timings, sizes and status codes go to `METRICS`. Return
+    None if Grobid could not process the pdf, which is then added to
+    `grobid_likes_not` if `keep_failures` is set.
+    """
+    pages = 0
+    if FULLTEXT:
+        service = client.FULLTEXT_SERVICE
     else:
-        logger.warning(
-            "Grobid server error, status code: %i. Problematic file: %s"  % (response.status_code, pdf_file))
-        grobid_likes_not.append(pdf_file)
+        service = client.HEADER_SERVICE
+        pages = HEADER_PAGES
+    if TEI_CACHE:
+        if pdf_digest is None:
+            with METRICS.timer(metrics.READ, pdf_file):
+                pdf_digest = cache.file_digest(pdf_file)
+        namespace = [GROBID.url(service), GROBID.version()]
+        if pages:
+            namespace.append("pages=%i" % pages)
+        cache_key = TEI_CACHE.key(pdf_digest, *namespace)
+        tei = TEI_CACHE.get(cache_key)
+        if tei is not None:
+            logger.debug("TEI cache hit for %s" % pdf_file)
+            METRICS.count("cache_hit", path=pdf_file)
+            METRICS.file(pdf_file, cache_hit=True, tei_bytes=len(tei))
+            return tei
+        METRICS.count("cache_miss", path=pdf_file)
+
+    first_pages = None
+    if pages:
+        with METRICS.timer(metrics.READ, pdf_file):
+            first_pages = splitter.first_pages(pdf_file, pages)
+    stats = {"status_codes": [], "retries": 0}
+    tei = None
+    try:
+        if first_pages:
+            tei = post_pdf(service, first_pages, pdf_file, stats)
+            if mapping.has_header(tei):
+                METRICS.file(pdf_file, upload_bytes=len(first_pages))
+            else:
+                logger.info("No header in the first %i pages of %s, sending "
+                            "the whole pdf" % (pages, pdf_file))
+                METRICS.count("header_fallback", path=pdf_file)
+                tei = None
+        if tei is None:
+            pdf = open_pdf(pdf_file)
+            try:
+                # The pdf is read from the file while it is uploaded, see
+                # `post_pdf` for the timing
+                tei = post_pdf(service, pdf, pdf_file, stats)
+            finally:
+                pdf.close()
+            METRICS.file(pdf_file, upload_bytes=scanner.STATS.size(pdf_file))
+    except client.GrobidError as err:
+        logger.warning("%s. Problematic file: %s" % (err, pdf_file))
+        if keep_failures:
+            grobid_likes_not.append(pdf_file)
         return None
+    finally:
+        METRICS.file(pdf_file, pdf_bytes=scanner.STATS.size(pdf_file), **stats)
+
+    METRICS.file(pdf_file, tei_bytes=len(tei))
+    if TEI_CACHE:
+        TEI_CACHE.put(cache_key, tei)
+    return tei
+
+def post_pdf(service, pdf, pdf_file, stats):
+    """Send a pdf to Grobid, adding the status codes and retries to `stats`.
+
+    The time spent reading a pdf file while it is uploaded goes to the
+    `metrics.READ` stage, the rest to `metrics.GROBID`.
+    """
+    post_stats = {}
+    start = time.time()
+    try:
+        return GROBID.post(service, pdf, filename=pdf_file, stats=post_stats)
+    finally:
+        read_seconds = post_stats.get("read_seconds", 0.0)
+        if not isinstance(pdf, bytes):
+            METRICS.add(metrics.READ, read_seconds, pdf_file)
+        METRICS.add(metrics.GROBID, time.time() - start - read_seconds, pdf_file)
+        stats["status_codes"].extend(post_stats.get("status_codes", ()))
+        stats["retries"] += post_stats.get("retries", 0)
+        if "endpoint" in post_stats:
+            stats["endpoint"] = post_stats["endpoint"]
+
+def process_pdf(pdf_path):
+    """Process one pdf file.
+
+    Return absolute path, parsed filename, XML (parsed pdf) in Grobid TEI
+    format and the SHA-256 digest of the pdf. The digest is taken here, in
+    the worker, for both the TEI cache and the manifest.
+    """
+    with METRICS.timer(metrics.READ, pdf_path):
+        pdf_digest = cache.file_digest(pdf_path)
+    return (
+        os.path.abspath(pdf_path),
+        parse_filename(os.path.basename(pdf_path)),
+        process_pdf_stream(pdf_path, pdf_digest),
+        pdf_digest,
+        )
+
+def find_pdfs(input_dir):
+    """Return the absolute paths of the pdf files of a directory by first page."""
+    return sorted(filter(is_contribution, scanner.iter_files(input_dir)),
+                  key=page_order)
+
+def largest_first(paths, window):
+    """Reorder `paths` by decreasing size within every `window` paths.
 
-def process_pdf_dir(input_dir):
+    Big pdfs are started before the small ones around them, instead of
+    holding up the end of the run. Paths only move inside their window, so
+    results written in the original order (`writer.CollectionWriter`) wait
+    for at most `window` files. Sizes come from `scanner.STATS`.
+    """
+    batch = []
+    for pdf_path in paths:
+        batch.append(pdf_path)
+        if len(batch) >= window:
+            for big in sorted(batch, key=scanner.STATS.size, reverse=True):
+                yield big
+            batch = []
+    for big in sorted(batch, key=scanner.STATS.size, reverse=True):
+        yield big
+
+def process_pdf_dir(input_dir, workers=1, exclude=None, paths=None, throttle=None,
+                    window=None):
     """Process the entire directory, but take only pdf files.
 
-    Return cnum, first page, and XML (parsed pdf) in Grobid TEI format.
+    Yield the results of `process_pdf`.
+    Without `paths`, the pdfs are processed while the directory is scanned.
+    With `workers` > 1 up to that many files are sent to Grobid at the
+    same time, largest first within every `window` files (default four per
+    worker), and the results are yielded in the order they complete.
+    Files for which `exclude(path)` returns True are skipped. `paths` are
+    the pdfs to process instead, e.g. of `find_pdfs`; they are read lazily.
+    `throttle(path)` is called before a file is submitted and may block;
+    with a throttle which waits for the files before, `window` must not be
+    larger than the files it lets through.
     """
-    paths = []
-    pdf_files = []
-    for root, dirnames, filenames in os.walk(input_dir):
-        for filename in fnmatch.filter(filenames, 'Pages_from*.pdf'):
-            paths.append(os.path.join(root, filename))
-            pdf_files.append(filename)
-
-    for filename, pdf_path in zip(pdf_files, paths):
-        yield (
-            os.path.abspath(pdf_path),
-            parse_filename(filename),
-            process_pdf_stream(pdf_path),
-            )
-
-def build_dicts(input_dir):
+    if paths is None:
+        paths = (pdf_path for pdf_path in scanner.iter_files(input_dir)
+                 if is_contribution(pdf_path))
+    if exclude:
+        paths = (pdf_path for pdf_path in paths if not exclude(pdf_path))
+    if workers > 1:
+        paths = largest_first(paths, window or 4 * workers)
+
+    def submit():
+        for pdf_path in paths:
+            if throttle:
+                throttle(pdf_path)
+            yield pdf_path
+
+    if workers > 1:
+        for processed_pdf in concurrency.imap_unordered(process_pdf, submit(), workers):
+            yield processed_pdf
+    else:
+        for pdf_path in submit():
+            yield process_pdf(pdf_path)
+
+def build_dict(processed_pdf, references=False, timings=None):
+    """Create a `mapping.Record` from the TEI XML data of one pdf.
+
+    If `timings` is a dictionary, the parsing and mapping times go to it.
+    """
+    record = mapping.Record()
+    pdf_path, parsed, tei = processed_pdf
+    cnum, fpage = parsed.cnum, parsed.fpage
+    if tei:
+        start = time.time()
+        root = mapping.parse_tei(tei)
+        parsed = time.time()
+        record = mapping.root_to_record(root, references=references)  # NOTE: this includes some empty elements, which is not cool
+        if timings is not None:
+            timings[metrics.PARSE] = parsed - start
+            timings[metrics.DICT] = time.time() - parsed
+    # NOTE: create a record even if pdf could not be grobided
+    record.pdf_path = pdf_path
+    record.cnum = cnum
+    record.fpage = fpage
+    return (record, cnum)
+
+def build_dicts(input_dir, workers=1, exclude=None, paths=None, throttle=None):
     """Create dictionaries from the TEI XML data."""
-    for processed_pdf in process_pdf_dir(input_dir):
-        rec_dict = {}
-        pdf_path, (cnum, fpage), tei = processed_pdf
-        if tei:
-            rec_dict = mapping.tei_to_dict(tei)  # NOTE: this includes some empty elements, which is not cool
-        # NOTE: create a record even if pdf could not be grobided
-        rec_dict["pdf_path"] = pdf_path
-        rec_dict["cnum"] = cnum
-        rec_dict["fpage"] = fpage
-        yield (rec_dict, cnum)
+    for processed_pdf in process_pdf_dir(input_dir, workers, exclude, paths, throttle):
+        record, cnum = build_dict(processed_pdf[:3], references=FULLTEXT)
+        yield (record.to_dict(), cnum)
 
 def write_jsons(dic):
     """Write json files. For testing."""
@@ -190,23 +364,17 @@ def write_xml(output_dir, filename, cnum, marcxml, separate=True):
             print(marcxml, file=xfile)
     else:
         # Here we should order these by the fpage number (key)
-        sorted_marcxml = [value for (key, value) in sorted(marcxml.items())]
-        # Create output directory, but remove old files ones with the same name:
         target_folder = output_dir + "/marc_records/"
-        if os.path.exists(target_folder + filename):
-            os.remove(target_folder + filename)
-        if not os.path.exists(target_folder):
-            os.makedirs(target_folder)
-        # Go though every record:
-        for mc in sorted_marcxml:
-            with open(target_folder + filename, "a+") as xfile:
-                print(mc, file=xfile, end='')
+        with writer.CollectionWriter(target_folder + filename,
+                                     sorted(marcxml)) as collection:
+            for key, value in marcxml.items():
+                collection.add(key, value)
 
 def get_authors(aut):
     """Get author name and affiliation. Format: 'lastname, firstname'."""
     author_name = ''
     surname = ''
-    surname, given_names = utils.split_fullname(aut.get("name"), surname_first=False)
+    surname, given_names = utils.split_fullname(aut.name, surname_first=False)
     if surname and "collaboration" in surname.lower():
         author_name = surname 
     if surname and given_names:
@@ -217,10 +385,8 @@ def get_authors(aut):
     elif surname:
         author_name = surname
     affiliations = []
-    aff_raws = aut.get("affiliations")
-    if aff_raws:
-        for aff in aff_raws:
-            affiliations.append(aff.get("value").strip("()"))
+    for aff in aut.affiliations:
+        affiliations.append(aff.value.strip("()"))
 
     return author_name, affiliations
 
@@ -228,110 +394,577 @@ def get_authors(aut):
 
 
 
-def build_marc_xml(input_dir, pubdate, separate=True):
-    """Build a MARCXML file from the HEPRecord dictionary."""
-    counter = 0
-    all_records = {}
-    cnum = ''
-    
-    for bd in build_dicts(input_dir):
-        dic, cnum = bd
-        if not dic:
-            # This is actually unneeded, but let it stay here for the moment
+def build_marcdict(record, pubdate):
+    """Build a MARC21 HEPRecord dictionary from a `mapping.Record`."""
+    marcdict = {}
+    authors = []
+    if record.authors:
+        # delete authors which have empty values:
+        for author in record.authors:
+            if author.name or author.affiliations:
+                authors.append(author)
+    if authors:
+        marcdict["100"] = []
+        marcdict["700"] = []
+        # Only the first author should be put in the 100 field, others to 700
+        author_name, affiliations = get_authors(authors[0])
+        if not author_name:
+            # "If you have a separate field for the affiliation it should always be 700 and no subfield $$a."
+            marcdict["700"].append({"v":affiliations})
+        else:
+            marcdict["100"].append({"v":affiliations, "a":author_name})
+        if len(authors) != 1:
+            for aut in authors[1:]:
+                author_name, affiliations = get_authors(aut)
+                marcdict["700"].append({"v":affiliations, "a":author_name})
+
+    title = record.title
+    if title:
+        marcdict["245"] = {"a": title.title()}
+    if pubdate:
+        marcdict["260"] = {"c": pubdate}
+    abstract = record.abstract
+    if abstract:
+        marcdict["520"] = {"a": abstract}
+    marcdict["773"] = {"c": record.fpage, "w":record.cnum}
+    marcdict["980"] = [{"a": "ConferencePaper"}, {"a": "HEP"}]
+    marcdict["FFT"] = {
+        "a": record.pdf_path,
+        "d": "Fulltext",
+        "t": "INSPIRE-PUBLIC",
+        }
+
+    # NOTE: we don't need the references at this point
+    #marcdict["999C5"] = []
+    #for ref in record.references:
+        #authors = ", ".join([aut["name"] for aut in ref["authors"]])
+        #title = ref["journal_pubnote"].get("journal_title", "")
+        #volume = ref["journal_pubnote"].get("journal_volume", "")
+        #pages = ref["journal_pubnote"].get("page_range", "")
+        #year = ref["journal_pubnote"].get("year", "")
+        #pubnote = u"{},{},{}".format(title, volume, pages)
+        #marcdict["999C5"].append({"s":pubnote, "y":year})
+
+    return marcdict
+
+
+def convert_pdf(processed_pdf, pubdate, references=False):
+    """Convert the Grobid output of one pdf to a MARCXML record.
+
+    Return pdf path, cnum, first page, the MARCXML, the timings of the
+    stages and the `mapping.Record`. This is the CPU bound part of the
+    pipeline, which `build_marc_xml` can run in a process pool.
+    """
+    timings = {}
+    record, cnum = build_dict(processed_pdf, references, timings)
+    start = time.time()
+    marcxml = utils.export_as_marc(build_marcdict(record, pubdate))
+    timings[metrics.SERIALIZE] = time.time() - start
+    return record.pdf_path, cnum, record.fpage, marcxml, timings, record
+
+
+def convert_upload(pdf_path, pubdate, filename=None):
+    """Convert one pdf for `service.RecordService`.
+
+    Return the `mapping.Record` and the MARCXML. `filename` is the name of
+    an uploaded pdf, which replaces its temporary path in the record.
+    Raise `service.ServiceError` if the file name has no cnum and first
+    page, and `client.GrobidError` if Grobid could not process the pdf.
+    """
+    name = filename or pdf_path
+    parsed = parse_filename(os.path.basename(name))
+    if parsed.kind != filenames.CONTRIBUTION:
+        raise service.ServiceError("No cnum and first page in the file name " +
+                                   os.path.basename(name), 400)
+    tei = process_pdf_stream(pdf_path, keep_failures=False)
+    if tei is None:
+        raise client.GrobidError("Grobid could not process " + os.path.basename(name))
+    processed_pdf = (
+        filename or os.path.abspath(pdf_path),
+        parsed,
+        tei,
+        )
+    _, _, _, marcxml, _, record = convert_pdf(processed_pdf, pubdate, references=FULLTEXT)
+    return record, marcxml
+
+
+def serve(port, workers=1):
+    """Run the HTTP service of `service` on localhost until interrupted.
+
+    No metrics are collected, as nothing would ever report or reset them.
+    """
+    global METRICS
+    METRICS = metrics.RunMetrics(enabled=False)
+    server = service.RecordService(convert_upload, find_pdfs, port=port,
+                                   workers=workers)
+    print("Serving records on " + server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def group_by_cnum(paths):
+    """Group pdf paths by cnum, keeping their order.
+
+    Return a list of (cnum, pdf paths), in the order of the first pdf of
+    every cnum.
+    """
+    groups = {}  # cnum: pdf paths
+    cnums = []
+    for pdf_path in paths:
+        cnum = parse_filename(os.path.basename(pdf_path), verbose=False).cnum
+        if cnum not in groups:
+            groups[cnum] = []
+            cnums.append(cnum)
+        groups[cnum].append(pdf_path)
+    return [(cnum, groups[cnum]) for cnum in cnums]
+
+
+def drop_stale_cnums(output_dir, cnums, progress):
+    """Remove the `<cnum>.xml` and record store of the cnums which have no
+    pdfs left.
+
+    The cnums of the earlier runs are those of the `progress` manifest and
+    of the record stores, and `cnums` are the ones found now. This happens
+    e.g. when the pdfs of a wrong cnum are renamed. Call this before
+    `progress.prune`.
+    """
+    known = set(store.find_stores(output_dir))
+    for entry in progress.entries.values():
+        known.add(entry.get("cnum") or parse_filename(
+            os.path.basename(entry["path"]), verbose=False).cnum)
+    for cnum in sorted(known - set(cnums)):
+        if not cnum:
             continue
+        for path in (output_dir + cnum + ".xml", store.store_path(output_dir, cnum)):
+            if os.path.exists(path):
+                os.remove(path)
+                logger.info("Removed " + path + ", no pdfs of " + cnum +
+                            " are left")
 
-        marcdict = {}
-        authors_raw = dic.get("authors")
-        authors = []
-        if authors_raw:
-            # delete authors which have empty values:
-            for author in authors_raw:
-                author_not_empty = dict((k, v) for k, v in author.iteritems() if v)
-                if author_not_empty:
-                    authors.append(author_not_empty)
-        if authors:
-            marcdict["100"] = []
-            marcdict["700"] = []
-            # Only the first author should be put in the 100 field, others to 700
-            author_name, affiliations = get_authors(authors[0])
-            if not author_name:
-                # "If you have a separate field for the affiliation it should always be 700 and no subfield $$a."
-                marcdict["700"].append({"v":affiliations})
-            else:
-                marcdict["100"].append({"v":affiliations, "a":author_name})
-            if len(authors) != 1:
-                for aut in authors[1:]:
-                    author_name, affiliations = get_authors(aut)
-                    marcdict["700"].append({"v":affiliations, "a":author_name})
-    
-        title = dic.get("title")
-        if title:
-            marcdict["245"] = {"a": title.title()}
-        if pubdate:
-            marcdict["260"] = {"c": pubdate}
-        abstract = dic.get("abstract")
-        if abstract:
-            marcdict["520"] = {"a": abstract}
-        marcdict["773"] = {"c": dic.get("fpage"), "w":dic.get("cnum")}
-        marcdict["980"] = [{"a": "ConferencePaper"}, {"a": "HEP"}]
-        marcdict["FFT"] = {
-            "a": dic["pdf_path"],
-            "d": "Fulltext",
-            "t": "INSPIRE-PUBLIC",
-            }
-
-        # NOTE: we don't need the references at this point
-        #marcdict["999C5"] = []
-        #for ref in dic["references"]:
-            #authors = ", ".join([aut["name"] for aut in ref["authors"]])
-            #title = ref["journal_pubnote"].get("journal_title", "")
-            #volume = ref["journal_pubnote"].get("journal_volume", "")
-            #pages = ref["journal_pubnote"].get("page_range", "")
-            #year = ref["journal_pubnote"].get("year", "")
-            #pubnote = u"{},{},{}".format(title, volume, pages)
-            #marcdict["999C5"].append({"s":pubnote, "y":year})
-
-        marcxml = utils.legacy_export_as_marc(marcdict)
-        filename = cnum + "_" + dic["fpage"] + ".xml"
-        print(marcdict["FFT"]["a"])
-        print(marcxml)
-        if separate:
-            # Write individual files
-            write_xml(input_dir, filename, cnum, marcxml)
+
+def build_marc_xml(input_dir, pubdate, separate=True, workers=1, resume=False,
+                   processes=1):
+    """Build a MARCXML file from the HEPRecord dictionary.
+
+    See `build_marc_xmls`, this processes one directory.
+    """
+    build_marc_xmls([input_dir], pubdate, separate, workers, resume, processes)
+
+
+def build_marc_xmls(input_dirs, pubdate, separate=True, workers=1, resume=False,
+                    processes=1):
+    """Build MARCXML files for the pdfs of one or more directories.
+
+    The pdfs of all the directories are processed in one stream, so Grobid
+    is kept busy across directories. A directory is scanned completely
+    before its pdfs are sent, as its records are written in page order, but
+    the next directory is only scanned once the pdfs of the one before have
+    been handed to the workers, while they are processed.
+    `workers` is the maximum number of pdfs sent to Grobid at the same time.
+    The largest pdfs are sent first, but only within every `max(10, 4 *
+    workers)` pdfs in page order, see `largest_first`.
+    With `processes` > 1 the Grobid output is converted to MARCXML in a pool
+    of that many processes.
+    Every processed pdf is logged to a manifest in the output directory. With
+    `resume`, pdfs which were finished by an earlier run with the same
+    settings and have not changed are not processed again, and the records
+    of deleted pdfs are dropped. The `<cnum>.xml` and record store of a
+    cnum which has no pdfs left are removed, with or without `resume`.
+    Without `separate`, the records are streamed to one collection file per
+    cnum (`marc_records/<cnum>.xml`) in fpage order as soon as all the
+    records before them are done.
+    The record dictionaries are also kept in `marc_records/<cnum>.records.jsonl.gz`,
+    see `export_marc_xmls`.
+    The timings of the pdfs of every directory are written to its
+    `marc_records/run_report.json`.
+    """
+    METRICS.reset()
+    settings = {"pubdate": pubdate, "fulltext": FULLTEXT}
+    finished = {}
+    outputs = {}  # pdf path: (input dir, manifest, collection, record store)
+    progresses = []
+    collection_writers = []
+    record_stores = []
+    # Records waiting for the ones before them in a collection, and the
+    # window in which the pdfs are reordered by size; see `largest_first`.
+    max_pending = max(10, 4 * workers)
+    try:
+        def scan_dirs():
+            """Set up the outputs of every directory and yield its pdfs."""
+            for input_dir in input_dirs:
+                output_dir = input_dir + "/marc_records/"
+                with METRICS.timer(metrics.SCAN, path=input_dir):
+                    dir_paths = find_pdfs(input_dir)
+                if not dir_paths:
+                    logger.warning("No pdfs in " + input_dir)
+                    if not os.path.exists(output_dir):
+                        continue
+                progress = manifest.Manifest(output_dir, resume=resume,
+                                             stat=scanner.STATS.stat)
+                progresses.append(progress)
+                cnum_groups = group_by_cnum(dir_paths)
+                drop_stale_cnums(output_dir, [cnum for cnum, _ in cnum_groups],
+                                 progress)
+                if resume:
+                    for entry in progress.prune(dir_paths):
+                        logger.info("Dropped the record of deleted " + entry["path"])
+                    done = 0
+                    for entry in progress.done():
+                        if not progress.is_done(entry["path"], **settings):
+                            continue
+                        if separate == ("marcxml" in entry):
+                            continue  # Done by a run with the other output mode
+                        marcxml = entry.get("marcxml")
+                        if isinstance(marcxml, unicode):
+                            marcxml = marcxml.encode("utf-8")  # Like the fresh records
+                        finished[entry["path"]] = marcxml
+                        done += 1
+                    logger.info("Resuming " + input_dir + ", " + str(done) +
+                                " records already done")
+                for cnum, cnum_paths in cnum_groups:
+                    record_store = store.RecordStore(store.store_path(output_dir, cnum))
+                    record_stores.append(record_store)
+                    if resume:
+                        record_store.compact(cnum_paths)
+                    else:
+                        record_store.clear()
+                    collection = None
+                    if not separate:
+                        # Write one big file for every cnum
+                        collection = writer.CollectionWriter(
+                            output_dir + cnum + ".xml", cnum_paths,
+                            max_pending=max_pending)
+                        collection_writers.append(collection)
+                        for pdf_path in cnum_paths:
+                            if pdf_path in finished:
+                                collection.add(pdf_path, finished[pdf_path])
+                    for pdf_path in cnum_paths:
+                        outputs[pdf_path] = (input_dir, progress, collection,
+                                             record_store)
+                for pdf_path in dir_paths:
+                    yield pdf_path
+
+        def exclude(pdf_path):
+            return pdf_path in finished
+
+        def throttle(pdf_path):
+            collection = outputs[pdf_path][2]
+            if collection:
+                collection.reserve(pdf_path)
+
+        digests = {}  # pdf path: SHA-256, for the manifest
+
+        def keep_digests(processed_pdfs):
+            for pdf_path, parsed, tei, pdf_digest in processed_pdfs:
+                digests[pdf_path] = pdf_digest
+                yield pdf_path, parsed, tei
+
+        convert = functools.partial(
+            convert_pdf, pubdate=pubdate, references=FULLTEXT)
+        processed_pdfs = keep_digests(process_pdf_dir(
+            None, workers, exclude, scan_dirs(), throttle, window=max_pending))
+        if processes > 1:
+            records = concurrency.process_imap(convert, processed_pdfs, processes)
         else:
-            # Append to dict
-            all_records[int(dic["fpage"])] = marcxml
-        counter += 1
+            records = (convert(processed_pdf) for processed_pdf in processed_pdfs)
+
+        for pdf_path, cnum, fpage, marcxml, timings, record in records:
+            for stage, seconds in timings.items():
+                METRICS.add(stage, seconds, pdf_path)
+            input_dir, progress, collection, record_store = outputs[pdf_path]
+            output_dir = input_dir + "/marc_records/"
+            filename = cnum + "_" + fpage + ".xml"
+            print(pdf_path)
+            print(marcxml)
+            status = manifest.DONE
+            if any(os.path.abspath(pdf) == pdf_path for pdf in grobid_likes_not):
+                status = manifest.FAILED
+            METRICS.file(pdf_path, status=status, marc_bytes=len(marcxml))
+            with METRICS.timer(metrics.WRITE, pdf_path):
+                record_store.append(record.to_dict())
+                pdf_digest = digests.pop(pdf_path)
+                if separate:
+                    # Write individual files
+                    write_xml(input_dir, filename, cnum, marcxml)
+                    progress.record(pdf_path, status, output_dir + filename,
+                                    sha256=pdf_digest, cnum=cnum, fpage=fpage,
+                                    **settings)
+                else:
+                    progress.record(pdf_path, status, collection.path,
+                                    sha256=pdf_digest, cnum=cnum, fpage=fpage,
+                                    marcxml=marcxml, **settings)
+                    collection.add(pdf_path, marcxml)
+    except BaseException:
+        for collection in collection_writers:
+            collection.abort()
+        raise
+    finally:
+        for progress in progresses:
+            progress.close()
+        for record_store in record_stores:
+            record_store.close()
 
+    input_dirs = sorted(set(output[0] for output in outputs.values()))
     if separate:
-        logger.info("Wrote " + str(counter) + " records to " + 
-                    input_dir + "/marc_records/" + cnum + "/")
+        for input_dir in input_dirs:
+            logger.info("Wrote " + str(sum(1 for output in outputs.values()
+                                           if output[0] == input_dir)) +
+                        " records to " + input_dir + "/marc_records/")
     else:
-        # Write one big file for the whole cnum
-        filename = cnum+".xml"
-        write_xml(input_dir, filename, cnum, all_records, separate=False)
+        for collection in collection_writers:
+            with METRICS.timer(metrics.WRITE, path=collection.path):
+                collection.close()
+            logger.info("Wrote " + str(collection.written) + " records to " +
+                        collection.path)
         print("\v\vFinished processing...")
-        logger.info("Wrote " + str(counter) + " records to " + 
-                    input_dir + "/marc_records/" + filename)
         if grobid_likes_not:
             logger.warning("Following pdfs were not processed: " 
                 + ", ".join(grobid_likes_not))
+    METRICS.finish()
+    for input_dir in input_dirs:
+        METRICS.write_report(input_dir + "/marc_records/run_report.json",
+                             under=input_dir)
+
+
+def export_marc_xmls(input_dirs, pubdate, separate=True):
+    """Build MARCXML files from the records stored by earlier runs.
+
+    Nothing is sent to Grobid and no TEI is parsed: the records are read
+    from `marc_records/<cnum>.records.jsonl.gz` (see `store`). This
+    redoes the MARCXML quickly, e.g. with another pubdate or after a change
+    of `build_marcdict`.
+    """
+    METRICS.reset()
+    for input_dir in input_dirs:
+        output_dir = input_dir + "/marc_records/"
+        stores = store.find_stores(output_dir)
+        if not stores:
+            logger.warning("No stored records in " + output_dir)
+            continue
+        for cnum, path in sorted(stores.items()):
+            with METRICS.timer(metrics.SCAN, path=path):
+                records = sorted(
+                    (mapping.Record.from_dict(dic)
+                     for dic in store.RecordStore(path).records()),
+                    key=lambda record: page_order(record.pdf_path))
+            collection = None
+            if not separate:
+                collection = writer.CollectionWriter(
+                    output_dir + cnum + ".xml",
+                    [record.pdf_path for record in records])
+            try:
+                for record in records:
+                    pdf_path = record.pdf_path
+                    with METRICS.timer(metrics.SERIALIZE, pdf_path):
+                        marcxml = utils.export_as_marc(build_marcdict(record, pubdate))
+                    with METRICS.timer(metrics.WRITE, pdf_path):
+                        if separate:
+                            filename = record.cnum + "_" + record.fpage + ".xml"
+                            write_xml(input_dir, filename, cnum, marcxml)
+                        else:
+                            collection.add(pdf_path, marcxml)
+                    METRICS.file(pdf_path, marc_bytes=len(marcxml))
+            except BaseException:
+                if collection:
+                    collection.abort()
+                raise
+            if collection:
+                with METRICS.timer(metrics.WRITE, path=collection.path):
+                    collection.close()
+            logger.info("Wrote " + str(len(records)) + " records of " + cnum +
+                        " to " + output_dir)
+        METRICS.finish()
+        METRICS.write_report(output_dir + "run_report.json", under=input_dir)
+
+
+def watch_marc_xmls(input_dirs, parents, pubdate, workers=1, processes=1,
+                    quiet=120, settle=5, interval=30, poll=False):
+    """Keep the MARCXML of the directories up to date as pdfs arrive.
+
+    All the directories are first brought up to date like with `resume`.
+    Then the directories, and the `parents` of conference directories (see
+    `-b`), are watched with `watcher.make_watcher`. A pdf which has not
+    changed for `settle` seconds is sent to Grobid right away by one of
+    `workers` threads, so that its TEI is in `TEI_CACHE` when its directory
+    is refreshed. Once no pdf of a directory has changed for `quiet`
+    seconds, its `<cnum>.xml` is rebuilt with `build_marc_xmls` and
+    `resume`, which only processes the new and modified pdfs. New
+    conference directories under the `parents` are picked up as well.
+    Runs until interrupted.
+    """
+    input_dirs = [os.path.abspath(input_dir) for input_dir in input_dirs]
+    parents = [os.path.abspath(parent) for parent in parents]
+
+    def input_dir_of(pdf_path):
+        """Return the input dir of a pdf, None if it is in none of them."""
+        for input_dir in input_dirs:
+            if pdf_path.startswith(os.path.join(input_dir, "")):
+                return input_dir
+        for parent in parents:
+            if pdf_path.startswith(os.path.join(parent, "")):
+                relative = os.path.relpath(pdf_path, parent)
+                if os.sep not in relative:
+                    return None  # Next to the input dirs, not in one
+                return os.path.join(parent, relative.split(os.sep)[0])
+
+    def refresh(dirs):
+        del grobid_likes_not[:]
+        try:
+            build_marc_xmls(dirs, pubdate, separate=False, workers=workers,
+                            resume=True, processes=processes)
+        except Exception:
+            logger.exception("Could not refresh " + ", ".join(dirs))
+            return False
+        return True
+
+    prefetch = queue.Queue()
+
+    def fetch():
+        while True:
+            pdf_path = prefetch.get()
+            try:
+                process_pdf_stream(pdf_path)
+            except Exception as err:
+                logger.warning("Could not send %s to Grobid: %s" % (pdf_path, err))
+            finally:
+                prefetch.task_done()
+
+    if TEI_CACHE:
+        for _ in range(workers):
+            thread = threading.Thread(target=fetch)
+            thread.daemon = True
+            thread.start()
+    else:
+        logger.info("Without the TEI cache the pdfs are sent to Grobid only "
+                    "when their directory is refreshed")
+
+    watch = watcher.make_watcher(input_dirs + parents, interval, poll)
+    # With polling a file is seen again at every scan while it is copied
+    settle = max(settle, watch.interval + 1)
+    initial = list(input_dirs)
+    for parent in parents:
+        initial.extend(os.path.join(parent, name) for name in sorted(os.listdir(parent))
+                       if os.path.isdir(os.path.join(parent, name)))
+    initial = [input_dir for input_dir in initial if watcher.scan([input_dir])]
+    if initial:
+        refresh(initial)
+    pending = {}  # pdf path: time of its last change
+    dirty = {}  # input dir: time of the last change of one of its pdfs
+    logger.info("Watching " + ", ".join(input_dirs + parents))
+    try:
+        while True:
+            for pdf_path in watch.changes(timeout=min(settle, quiet)):
+                input_dir = input_dir_of(pdf_path)
+                if input_dir:
+                    pending[pdf_path] = dirty[input_dir] = time.time()
+            now = time.time()
+            for pdf_path, changed in list(pending.items()):
+                if now - changed >= settle:
+                    del pending[pdf_path]
+                    if TEI_CACHE and os.path.exists(pdf_path):
+                        prefetch.put(pdf_path)
+            busy = set(input_dir_of(pdf_path) for pdf_path in pending)
+            ready = sorted(input_dir for input_dir, changed in dirty.items()
+                           if now - changed >= quiet and input_dir not in busy)
+            if ready:
+                prefetch.join()
+                for input_dir in ready:
+                    del dirty[input_dir]
+                logger.info("Refreshing " + ", ".join(ready))
+                if not refresh(ready):
+                    for input_dir in ready:
+                        dirty[input_dir] = time.time()  # Try again later
+    except KeyboardInterrupt:
+        logger.info("Stopped watching")
+    finally:
+        watch.close()
 
 
 def main(argv):
     """Main function."""
-    input_dir = ''
+    input_dirs = []
     pubdate = ''
-    helptext = ("\v* Usage: python grobid_proceedings.py -i <input_dir> -p <pubdate>\n\v"
+    workers = 1
+    cache_dir = cache.DEFAULT_DIR
+    cache_size = cache.DEFAULT_MAX_SIZE
+    rebuild_cache = False
+    resume = False
+    adaptive = False
+    fulltext = False
+    header_pages = 0
+    prometheus_file = ''
+    grobid_hosts = []
+    from_records = False
+    watch = False
+    serve_port = 0
+    parents = []
+    batch_dirs = []
+    quiet = 120
+    poll = 0
+    processes = multiprocessing.cpu_count()
+    helptext = ("\v* Usage: python grobid_proceedings.py -i <input_dir> [-i <input_dir> ...] | -b <parent_dir> -p <pubdate> "
+        "[-n <workers>] [--adaptive] [-j <processes>] [--cache-dir=<dir> | --no-cache] [--cache-size=<MB>] [--rebuild-cache] [-r] [--fulltext | --pages=<N>] [--prometheus=<file>] [--grobid=<url>[,<weight>] ...] [--from-records] [--watch [--quiet=<seconds>] [--poll=<seconds>]]\n"
+        "  python grobid_proceedings.py --serve=<port> [-n <workers>] [--cache-dir=<dir> | --no-cache] [--fulltext | --pages=<N>] [--grobid=<url>[,<weight>] ...]\n\v"
         "* <input_dir> is the directory where the conference files are, e.g.\n"
         "  `/afs/cern.ch/project/inspire/uploads/library/moriond/for_grobid/C12-03-10/`\n"
+        "* With -b (--batch) every subdirectory of <parent_dir> is processed, e.g.\n"
+        "  `/afs/cern.ch/project/inspire/uploads/library/moriond/for_grobid/`. All the "
+        "pdfs of all the directories go through the same workers.\n"
         "* Pubdate has to be manually inserted, because the pdfs contain no "
         "information about that.\n"
         "* Output MARCXML records will be put to the same directory under subdirectory "
-        "`marcxmls/`"
+        "`marc_records/`, one `<cnum>.xml` per cnum\n"
+        "* <workers> is the maximum number of pdfs sent to Grobid at the same "
+        "time (default 1). With --adaptive the number grows up to <workers> as "
+        "long as Grobid keeps up, and shrinks when it answers 503, times out "
+        "or slows down. The biggest pdfs are sent first, within every "
+        "4 x <workers> (at least 10) pdfs in page order. Every directory is "
+        "scanned completely before its pdfs are sent; the next one is scanned "
+        "while they are processed.\n"
+        "* <processes> is the number of processes converting the Grobid output "
+        "to MARCXML (default: number of cores).\n"
+        "* Grobid results are cached in <dir> (default `" + cache.DEFAULT_DIR + "`), "
+        "so unchanged pdfs are not sent to Grobid again. `--no-cache` bypasses "
+        "the cache and `--rebuild-cache` replaces the cached results. The oldest "
+        "results are removed when the cache grows over <MB> megabytes.\n"
+        "* With -r (--resume, --incremental) only new and modified pdfs are processed: the pdfs "
+        "finished by an earlier or interrupted run are skipped, records of deleted "
+        "pdfs are dropped and `<cnum>.xml` is rebuilt from the records kept in "
+        "`marc_records/manifest.jsonl`.\n"
+        "* Only the headers of the pdfs are sent to Grobid. Use --fulltext to "
+        "process the whole documents, including the references. With --pages "
+        "only the first <N> pages of every pdf are sent, unless Grobid finds no "
+        "title or authors in them (needs PyPDF2).\n"
+        "* Timings of the pdfs of every directory are written to its "
+        "`marc_records/run_report.json`, and with --prometheus the ones of the "
+        "whole run to <file> for the node exporter textfile collector.\n"
+        "* Grobid runs on " + client.DEFAULT_HOST + " unless --grobid is given. With "
+        "several --grobid, the pdfs are spread over the Grobid servers by their "
+        "<weight> (default 1) and the requests they have in progress; a server "
+        "which stops answering is skipped for a while.\n"
+        "* The extracted records are kept in `marc_records/<cnum>.records.jsonl.gz`. "
+        "With --from-records the MARCXML is written again from them, e.g. with "
+        "another pubdate, without sending anything to Grobid.\n"
+        "* With --watch the directories (with -b also new subdirectories of "
+        "<parent_dir>) are watched until interrupted: new and modified pdfs are "
+        "sent to Grobid as they arrive, and `<cnum>.xml` is rebuilt once no pdf "
+        "of the directory has changed for <seconds> (--quiet, default 120). "
+        "Changes are found with inotify (pip install pyinotify), or by scanning "
+        "every <seconds> (--poll, default 30) on AFS and without pyinotify.\n"
+        "* With --serve the records are served over HTTP on localhost:<port> "
+        "instead, to other tools: single pdfs are converted right away, "
+        "batches of pdfs and directories run as jobs which are polled for the "
+        "result. See `grobid_proceedings/service.py` for the API."
         )
     try:
-        opts, args = getopt.getopt(argv, "hi:p:", ["ifile=", "pubdate="])
+        opts, args = getopt.getopt(argv, "hi:b:p:n:j:r", [
+            "ifile=", "batch=", "pubdate=", "workers=", "processes=", "adaptive", "resume", "incremental",
+            "cache-dir=", "no-cache", "cache-size=", "rebuild-cache", "fulltext", "pages=", "prometheus=",
+            "grobid=", "from-records", "watch", "quiet=", "poll=", "serve="])
     except getopt.GetoptError:
         print(helptext)
         sys.exit(2)
@@ -340,21 +973,103 @@ def main(argv):
             print(helptext)
             sys.exit()
         elif opt in ("-i", "--ifile"):
-            input_dir = arg
+            input_dirs.append(arg)
+        elif opt in ("-b", "--batch"):
+            if not os.path.isdir(arg):
+                print("Path `"+ arg +"` doesn't exist!")
+                sys.exit(2)
+            parents.append(arg)
+            subdirs = [os.path.join(arg, name) for name in sorted(os.listdir(arg))
+                       if os.path.isdir(os.path.join(arg, name))]
+            batch_dirs.extend(subdirs)
+            input_dirs.extend(subdirs)
         elif opt in ("-p", "--pubdate"):
             pubdate = arg
+        elif opt in ("-n", "--workers"):
+            workers = int(arg)
+        elif opt == "--adaptive":
+            adaptive = True
+        elif opt in ("-j", "--processes"):
+            processes = int(arg)
+        elif opt in ("-r", "--resume", "--incremental"):
+            resume = True
+        elif opt == "--cache-dir":
+            cache_dir = arg
+        elif opt == "--no-cache":
+            cache_dir = ''
+        elif opt == "--cache-size":
+            cache_size = int(arg) * 1024 ** 2
+        elif opt == "--rebuild-cache":
+            rebuild_cache = True
+        elif opt == "--fulltext":
+            fulltext = True
+        elif opt == "--pages":
+            header_pages = int(arg)
+        elif opt == "--prometheus":
+            prometheus_file = arg
+        elif opt == "--grobid":
+            host, _, weight = arg.partition(",")
+            grobid_hosts.append((host, float(weight or 1)))
+        elif opt == "--from-records":
+            from_records = True
+        elif opt == "--watch":
+            watch = True
+        elif opt == "--quiet":
+            quiet = float(arg)
+        elif opt == "--poll":
+            poll = float(arg)
+        elif opt == "--serve":
+            serve_port = int(arg)
 
-    if input_dir:
+    global GROBID, TEI_CACHE, FULLTEXT, HEADER_PAGES
+    def make_client(host, **options):
+        limit = concurrency.AdaptiveLimit(workers) if adaptive else None
+        return client.GrobidClient(
+            host, pool_size=max(workers, 10), limit=limit, **options)
+
+    if len(grobid_hosts) > 1:
+        GROBID = balancer.GrobidBalancer(
+            [make_client(host, retries=0) for host, _ in grobid_hosts],
+            weights=[weight for _, weight in grobid_hosts])
+    else:
+        GROBID = make_client(grobid_hosts[0][0] if grobid_hosts else client.DEFAULT_HOST)
+    FULLTEXT = fulltext
+    HEADER_PAGES = header_pages
+    if header_pages and splitter.PyPDF2 is None:
+        logger.warning("--pages needs PyPDF2, sending the whole pdfs")
+    if cache_dir:
+        TEI_CACHE = cache.TEICache(
+            cache_dir, max_size=cache_size, rebuild=rebuild_cache)
+
+    if serve_port:
+        serve(serve_port, workers)
+    elif input_dirs or (watch and parents):
         #input_dir = "/afs/cern.ch/project/inspire/uploads/library/moriond/for_grobid/" + input_dir
-        if os.path.exists(input_dir):
-            print('Processing directory (CNUM)"', input_dir + '"')
+        missing = [input_dir for input_dir in input_dirs
+                   if not os.path.exists(input_dir)]
+        if missing:
+            print("Path `"+ "`, `".join(missing) +"` doesn't exist!")
+        else:
+            for input_dir in input_dirs:
+                print('Processing directory (CNUM)"', input_dir + '"')
             # With the argument `separate`, you can specify if the output should
             # be one record per file or all records in one file.
-            build_marc_xml(input_dir, pubdate, separate=False)
-        else:
-            print("Path `"+ input_dir +"` doesn't exist!")
+            if watch:
+                watch_marc_xmls(
+                    [input_dir for input_dir in input_dirs
+                     if input_dir not in batch_dirs],
+                    parents, pubdate, workers=workers, processes=processes,
+                    quiet=quiet, interval=poll or 30, poll=bool(poll))
+            elif from_records:
+                export_marc_xmls(input_dirs, pubdate, separate=False)
+            else:
+                build_marc_xmls(input_dirs, pubdate, separate=False, workers=workers,
+                                resume=resume, processes=processes)
+            if prometheus_file:
+                METRICS.write_prometheus(prometheus_file)
     else:
         print(helptext)
 
 if __name__ == "__main__":
+    setup_logging()
     main(sys.argv[1:])
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016 CERN.
+
+"""Spread Grobid requests over several Grobid servers.
+
+`GrobidBalancer` has the interface of `client.GrobidClient` used by the
+pipeline and sends every request to the endpoint with the fewest
+outstanding requests relative to its weight. Endpoints which fail
+repeatedly, or do not answer the periodic `api/isalive` probe, are taken
+out for a while (circuit breaker). A request which fails with a 503, a
+timeout or a connection error is sent again to another endpoint.
+"""
+
+from __future__ import absolute_import
+
+import logging
+import threading
+import time
+
+from grobid_proceedings.client import (
+    GrobidError,
+    RETRY_STATUS_CODES,
+    backoff_delay,
+    )
+
+
+logger = logging.getLogger(__name__)
+
+
+class Endpoint(object):
+    """One Grobid server of a `GrobidBalancer`.
+
+    :param client: `client.GrobidClient` of the server
+    :param weight: share of the requests relative to the other endpoints
+    """
+
+    def __init__(self, client, weight=1):
+        self.client = client
+        self.weight = float(weight)
+        self.outstanding = 0
+        self.failures = 0
+        self.open_until = 0
+
+    @property
+    def url(self):
+        return self.client.host
+
+    def load(self):
+        """Outstanding requests relative to the weight, with one more."""
+        return (self.outstanding + 1) / self.weight
+
+
+class GrobidBalancer(object):
+    """Weighted least-outstanding-requests routing over Grobid endpoints.
+
+    The clients should not retry themselves (`retries=0`), so that a failed
+    request is tried on another endpoint right away. Once every available
+    endpoint has failed a request, the next round waits with exponential
+    backoff.
+
+    :param clients: `client.GrobidClient` of every endpoint
+    :param weights: weight of every endpoint, by default 1
+    :param retries: how many times a failed request is sent again
+    :param backoff: seconds to wait before the second round, doubled after
+        every round
+    :param max_backoff: upper limit for the wait between rounds
+    :param failure_threshold: consecutive failures which take an endpoint out
+    :param cooldown: seconds an endpoint stays out before it is tried again
+    :param probe_interval: seconds between `api/isalive` probes, 0 disables
+        them
+    """
+
+    def __init__(self, clients, weights=None, retries=5, backoff=2,
+                 max_backoff=120, failure_threshold=3, cooldown=30,
+                 probe_interval=10):
+        weights = weights or [1] * len(clients)
+        self.endpoints = [Endpoint(client, weight)
+                          for client, weight in zip(clients, weights)]
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.probe_interval = probe_interval
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        if probe_interval:
+            prober = threading.Thread(target=self.probe_loop)
+            prober.daemon = True
+            prober.start()
+
+    @property
+    def host(self):
+        return self.endpoints[0].url
+
+    def close(self):
+        """Stop the probes and close the connections."""
+        self.stopped.set()
+        for endpoint in self.endpoints:
+            endpoint.client.close()
+
+    def url(self, service):
+        """Return the url of a service on the first endpoint.
+
+        The endpoints are expected to run the same Grobid, so this also
+        names the results of the others, e.g. in the TEI cache.
+        """
+        return self.endpoints[0].client.url(service)
+
+    def version(self):
+        """Return the Grobid version of the first endpoint that tells."""
+        for endpoint in self.endpoints:
+            if endpoint.open_until <= time.time():
+                version = endpoint.client.version()
+                if version:
+                    return version
+        return ""
+
+    def choose(self, exclude=()):
+        """Pick the least loaded available endpoint not in `exclude`.
+
+        Its outstanding requests are increased; call `release` when done.
+        Return None if there is no such endpoint.
+        """
+        now = time.time()
+        with self.lock:
+            candidates = [endpoint for endpoint in self.endpoints
+                          if endpoint not in exclude and endpoint.open_until <= now]
+            if not candidates:
+                return None
+            endpoint = min(candidates, key=Endpoint.load)
+            endpoint.outstanding += 1
+            return endpoint
+
+    def release(self, endpoint):
+        """End a request of an endpoint returned by `choose`."""
+        with self.lock:
+            endpoint.outstanding -= 1
+
+    def succeeded(self, endpoint):
+        """Close the circuit breaker of a working endpoint."""
+        with self.lock:
+            if endpoint.failures >= self.failure_threshold:
+                logger.info("Grobid endpoint %s is back" % endpoint.url)
+            endpoint.failures = 0
+            endpoint.open_until = 0
+
+    def failed(self, endpoint, reason, count=1):
+        """Count failures of an endpoint and take it out after too many."""
+        with self.lock:
+            endpoint.failures += count
+            if endpoint.failures >= self.failure_threshold:
+                if endpoint.open_until <= time.time():
+                    logger.warning("Grobid endpoint %s is out for %i s: %s"
+                                   % (endpoint.url, self.cooldown, reason))
+                endpoint.open_until = time.time() + self.cooldown
+
+    def probe(self):
+        """Ask every endpoint whether it is alive."""
+        for endpoint in self.endpoints:
+            if endpoint.client.is_alive():
+                self.succeeded(endpoint)
+            else:
+                self.failed(endpoint, "api/isalive probe failed",
+                            count=self.failure_threshold)
+
+    def probe_loop(self):
+        while not self.stopped.wait(self.probe_interval):
+            self.probe()
+
+    def untried(self, tried):
+        """Return True if an available endpoint is not in `tried`."""
+        now = time.time()
+        return any(endpoint not in tried and endpoint.open_until <= now
+                   for endpoint in self.endpoints)
+
+    def post(self, service, pdf, filename=None, stats=None):
+        """Post one pdf to a Grobid service and return the response text.
+
+        See `client.GrobidClient.post`. The url of the endpoint which
+        answered goes to `stats["endpoint"]`.
+        """
+        if stats is None:
+            stats = {}
+        stats.setdefault("status_codes", [])
+        stats["retries"] = 0
+        stats.setdefault("read_seconds", 0.0)
+        tried = set()
+        attempt = 0
+        rounds = 0
+        while True:
+            endpoint = self.choose(tried)
+            if endpoint is None:
+                error = GrobidError("No Grobid endpoint is available")
+            else:
+                tried.add(endpoint)
+                stats["endpoint"] = endpoint.url
+                attempt_stats = {}
+                try:
+                    tei = endpoint.client.post(service, pdf, filename, attempt_stats)
+                except GrobidError as err:
+                    error = err
+                else:
+                    self.succeeded(endpoint)
+                    return tei
+                finally:
+                    self.release(endpoint)
+                    stats["status_codes"].extend(attempt_stats["status_codes"])
+                    stats["read_seconds"] += attempt_stats.get("read_seconds", 0.0)
+                if error.status_code is None:
+                    self.failed(endpoint, str(error))  # Timeout or no connection
+                elif error.status_code not in RETRY_STATUS_CODES:
+                    raise error
+            if attempt >= self.retries:
+                raise error
+            attempt += 1
+            stats["retries"] = attempt
+            if endpoint is not None and self.untried(tried):
+                logger.info("%s, sending %s to another endpoint (%i/%i)"
+                            % (error, filename, attempt, self.retries))
+                continue
+            logger.info("%s, retrying %s (%i/%i)"
+                        % (error, filename, attempt, self.retries))
+            time.sleep(backoff_delay(rounds, self.backoff, self.max_backoff))
+            rounds += 1
+            tried = set()
@@ -0,0 +1,505 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016 CERN.
+
+"""Benchmarks for the proceedings pipeline.
+
+`pipeline` runs `build_marc_xml` over a synthetic directory of pdfs against a
+local stub Grobid (`stubserver`) and reports throughput, peak memory and the
+time spent in the stages, as collected in `grobid_proceedings.METRICS`.
+Run it from the top of a checkout, the original implementations and the
+fixtures some benchmarks compare with are in `tests`.
+
+USAGE EXAMPLES:
+$ python -m grobid_proceedings.benchmark serializer
+$ python -m grobid_proceedings.benchmark serializer -n 20000
+$ python -m grobid_proceedings.benchmark mapping -n 300
+$ python -m grobid_proceedings.benchmark names -n 200000
+$ python -m grobid_proceedings.benchmark filenames -n 50000
+$ python -m grobid_proceedings.benchmark pipeline -n 300 -w 8 -l 0.2 -c 8
+$ python -m grobid_proceedings.benchmark pipeline -n 300 -w 16 -j 4 -e 0.05
+$ python -m grobid_proceedings.benchmark pipeline -n 300 -w 32 -c 8 -a
+$ python -m grobid_proceedings.benchmark pipeline -n 300 -w 24 -c 8 -b 3
+"""
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+import getopt
+import imp
+import logging
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import timeit
+
+from grobid_proceedings import (
+    balancer,
+    client,
+    concurrency,
+    filenames,
+    mapping,
+    metrics,
+    stubserver,
+    utils,
+    )
+from tests import fixtures, legacy
+
+
+SCRIPT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "grobid_proceedings.py")
+
+
+def make_marcdicts(count, seed=0):
+    """Create `count` MARC dictionaries shaped like the `build_marc_xml` ones."""
+    rand = random.Random(seed)
+    names = [u"Müller, J.", u"Smith, A. B.", u"Ñúñez, María", "van der Berg, K.",
+             u"ATLAS Collaboration", "O'Neil, P."]
+    institutions = [u"CERN", u"LAPP & Université de Savoie", u"INFN <Sezione> Roma",
+                    u"KEK\x0c", u"DESY"]
+    marcdicts = []
+    for number in range(count):
+        authors = [{"a": rand.choice(names),
+                    "v": rand.sample(institutions, rand.randint(0, 2))}
+                   for _ in range(rand.randint(1, 12))]
+        marcdicts.append({
+            "100": authors[:1],
+            "700": authors[1:],
+            "245": {"a": u"Search For New Physics & Other Things %i" % number},
+            "260": {"c": "2012"},
+            "520": {"a": u"We present <results> on ϕ → K⁺K⁻. " * rand.randint(1, 20)},
+            "773": {"c": str(rand.randint(1, 600)), "w": "C12-03-10"},
+            "980": [{"a": "ConferencePaper"}, {"a": "HEP"}],
+            "FFT": {"a": "/afs/cern.ch/Pages_from_C12-03-10_%i.pdf" % number,
+                    "d": "Fulltext", "t": "INSPIRE-PUBLIC"},
+            })
+    return marcdicts
+
+
+def bench_serializer(count=5000, repeat=3):
+    """Compare `utils.export_as_marc` with `utils.legacy_export_as_marc`."""
+    marcdicts = make_marcdicts(count)
+    for marcdict in marcdicts:
+        if utils.export_as_marc(marcdict) != utils.legacy_export_as_marc(marcdict):
+            raise AssertionError("Different output for %r" % marcdict)
+    print("Output identical for %i records" % count)
+
+    timings = {}
+    for func in (utils.legacy_export_as_marc, utils.export_as_marc):
+        timings[func] = min(timeit.repeat(
+            lambda: [func(marcdict) for marcdict in marcdicts],
+            number=1, repeat=repeat))
+        print("%-22s %8.3f s  %8.0f records/s"
+              % (func.__name__, timings[func], count / timings[func]))
+    print("Speed-up: %.1fx" % (timings[utils.legacy_export_as_marc]
+                               / timings[utils.export_as_marc]))
+
+
+# The TEI mapping before precompiled XPath, as a reference for `bench_mapping`
+
+def _legacy_xpath(el, path):
+    return el.xpath(path, namespaces=mapping.NS)
+
+
+def legacy_tei_to_dict(tei):
+    """Original `mapping.tei_to_dict`, evaluating every XPath at each call."""
+    root = mapping.parse_tei(tei)
+
+    result = {}
+
+    abstract = _legacy_xpath(root, '//tei:profileDesc/tei:abstract/tei:p')
+    if abstract and len(abstract) == 1:
+        result['abstract'] = abstract[0].text
+
+    authors = _legacy_xpath(root, '//tei:fileDesc//tei:author')
+    if authors:
+        result['authors'] = [legacy_element_to_author(el) for el in authors]
+
+    keywords = _legacy_xpath(root, '//tei:profileDesc/tei:textClass/tei:keywords')
+    if keywords and len(keywords) == 1:
+        result['keywords'] = [{'value': e.text} for e in
+                              _legacy_xpath(keywords[0], './/tei:term')]
+
+    title = _legacy_xpath(root, '//tei:titleStmt/tei:title')
+    if title and len(title) == 1:
+        result['title'] = title[0].text
+
+    references = _legacy_xpath(root, '//tei:text//tei:listBibl/tei:biblStruct')
+    if references:
+        result['references'] = [legacy_element_to_reference(el) for el in references]
+
+    return result
+
+
+def legacy_element_to_author(el):
+    name = []
+    first = _legacy_xpath(el, './/tei:persName/tei:forename[@type="first"]')
+    if first and len(first) == 1:
+        name.append(first[0].text)
+    middle = _legacy_xpath(el, './/tei:persName/tei:forename[@type="middle"]')
+    if middle and len(middle) == 1:
+        name.append(middle[0].text + '.')
+    surname = _legacy_xpath(el, './/tei:persName/tei:surname')
+    if surname and len(surname) == 1:
+        name.append(surname[0].text)
+
+    affiliations = []
+    for aff in _legacy_xpath(el, './/tei:affiliation'):
+        for institution in _legacy_xpath(aff, './/tei:orgName[@type="institution"]'):
+            affiliations.append({'value': institution.text})
+
+    return {'name': ' '.join(name), 'affiliations': affiliations}
+
+
+def legacy_element_to_reference(el):
+    result = {}
+
+    title = _legacy_xpath(
+        el, './/tei:analytic/tei:title[@level="a" and @type="main"]')
+    result['ref_title'] = title[0].text if title and len(title) == 1 else None
+
+    result['authors'] = [legacy_element_to_author(e)
+                         for e in _legacy_xpath(el, './/tei:author')]
+
+    pubnote = {}
+    imprint = './tei:monogr/tei:imprint/'
+    for key, path in (
+            ('journal_title', './tei:monogr/tei:title'),
+            ('journal_volume', imprint + 'tei:biblScope[@unit="volume"]'),
+            ('journal_issue', imprint + 'tei:biblScope[@unit="issue"]')):
+        found = _legacy_xpath(el, path)
+        if found and len(found) == 1:
+            pubnote[key] = found[0].text
+    year = _legacy_xpath(el, imprint + 'tei:date[@type="published"]/@when')
+    if year and len(year) == 1:
+        pubnote['year'] = year[0]
+    pages = []
+    for path in (imprint + 'tei:biblScope[@unit="page"]/@from',
+                 imprint + 'tei:biblScope[@unit="page"]/@to'):
+        page = _legacy_xpath(el, path)
+        if page and len(page) == 1:
+            pages.append(page[0])
+    pubnote['page_range'] = '-'.join(pages)
+    result['journal_pubnote'] = pubnote
+
+    return result
+
+
+def make_teis(count, seed=0):
+    """Create `count` Grobid fulltext TEI documents with long bibliographies.
+
+    Names, affiliations and bibliographic scopes are left out at random, and
+    some documents repeat a part of a name, so that every branch of the
+    mapping is taken.
+    """
+    rand = random.Random(seed)
+
+    def sometimes(text, probability=0.9):
+        return text if rand.random() < probability else ""
+
+    def author():
+        parts = sometimes('<forename type="first">%s</forename>' % rand.choice(
+            [u"J", u"Jean-Pierre", u"Zoë", u"A."]))
+        parts += sometimes('<forename type="middle">%s</forename>'
+                           % rand.choice([u"K", u"L"]), 0.4)
+        parts += sometimes('<surname>%s</surname>' % rand.choice(
+            [u"Smith", u"Müller", u"van der Berg"]), 0.95)
+        parts += sometimes('<forename type="first">Dup</forename>', 0.1)
+        affiliations = "".join(
+            '<affiliation><orgName type="department">Physics</orgName>'
+            '<orgName type="institution">%s</orgName></affiliation>'
+            % rand.choice([u"CERN", u"(LAPP)", u"INFN &amp; Univ."])
+            for _ in range(rand.randint(0, 2)))
+        return '<author><persName>%s</persName>%s</author>' % (parts, affiliations)
+
+    def reference():
+        scopes = ""
+        for unit in rand.sample(["volume", "issue", "page", "page", "volume"],
+                                rand.randint(0, 4)):
+            if unit == "page":
+                scopes += '<biblScope unit="page" %s %s/>' % (
+                    sometimes('from="%i"' % rand.randint(1, 999), 0.8),
+                    sometimes('to="%i"' % rand.randint(1, 999), 0.7))
+            else:
+                scopes += '<biblScope unit="%s">%i</biblScope>' % (
+                    unit, rand.randint(1, 99))
+        analytic = sometimes(
+            '<analytic><title level="a" type="main">Reference %i</title>%s</analytic>'
+            % (rand.randint(0, 9), "".join(author() for _ in range(rand.randint(0, 3)))),
+            0.7)
+        return ('<biblStruct>%s<monogr>%s<imprint>%s%s</imprint></monogr></biblStruct>'
+                % (analytic, sometimes('<title level="j">Phys. Rev. %s</title>'
+                                       % rand.choice("ABCD"), 0.8),
+                   scopes, sometimes('<date type="published" when="%i"/>'
+                                     % rand.randint(1950, 2016), 0.8)))
+
+    teis = []
+    for _ in range(count):
+        tei = (u'<?xml version="1.0" encoding="UTF-8"?>'
+               u'<TEI xmlns="http://www.tei-c.org/ns/1.0"><teiHeader><fileDesc>'
+               u'<titleStmt><title level="a" type="main">%s</title></titleStmt>'
+               u'<sourceDesc><biblStruct><analytic>%s</analytic></biblStruct></sourceDesc>'
+               u'</fileDesc><profileDesc>%s%s</profileDesc></teiHeader>'
+               u'<text><back><div><listBibl>%s</listBibl></div></back></text></TEI>') % (
+            sometimes(u"Search for new physics"),
+            "".join(author() for _ in range(rand.randint(0, 6))),
+            sometimes('<textClass><keywords><term>QCD</term><term>jets</term>'
+                      '</keywords></textClass>', 0.5),
+            sometimes('<abstract><p>We present results &amp; prospects %i.</p>'
+                      '</abstract>' % rand.randint(0, 9), 0.8),
+            "".join(reference() for _ in range(rand.randint(0, 60))))
+        teis.append(tei.encode("utf-8"))
+    return teis
+
+
+def bench_mapping(count=300, repeat=3):
+    """Compare `mapping.tei_to_dict` with `legacy_tei_to_dict`.
+
+    `Record.to_dict` has all the `Record.TEXT_FIELDS`, the legacy mapping
+    only those it found and the pipeline added the others, as None here.
+    """
+    teis = make_teis(count)
+    for tei in teis:
+        expected = dict.fromkeys(mapping.Record.TEXT_FIELDS)
+        expected.update(legacy_tei_to_dict(tei))
+        result = mapping.tei_to_dict(tei)
+        if result != expected:
+            raise AssertionError("Different output for %r" % tei)
+    print("Output identical for %i documents, %i references"
+          % (count, sum(tei.count(b"<biblStruct>") for tei in teis)))
+
+    timings = {}
+    for func in (legacy_tei_to_dict, mapping.tei_to_dict):
+        timings[func] = min(timeit.repeat(
+            lambda: [func(tei) for tei in teis], number=1, repeat=repeat))
+        print("%-22s %8.3f s  %8.0f documents/s"
+              % (func.__name__, timings[func], count / timings[func]))
+    print("Speed-up: %.1fx" % (timings[legacy_tei_to_dict]
+                               / timings[mapping.tei_to_dict]))
+
+
+def bench_names(count=200000, repeat=3, distinct=2000, seed=0):
+    """Compare `utils.split_fullname` with `tests.legacy.legacy_split_fullname`.
+
+    The timing calls both on `count` names drawn from `distinct` different
+    ones, as in the author lists of a conference series.
+    """
+    checked = 0
+    for name in fixtures.GOLDEN_NAMES:
+        for surname_first in (True, False):
+            try:
+                expected = legacy.legacy_split_fullname(name, surname_first)
+            except IndexError:
+                expected = ("", "")  # Nothing left of the name
+            result = utils.split_fullname(name, surname_first)
+            if result != expected:
+                raise AssertionError("%r gives %r instead of %r"
+                                     % (name, result, expected))
+            checked += 1
+    print("Output identical for %i golden names" % checked)
+
+    rand = random.Random(seed)
+    forenames = [u"Jean", u"J.", u"María", u"A. B.", u"Pierre-Yves", u"K"]
+    surnames = [u"Müller", u"Smith", u"van der Berg", u"Ñúñez", u"Dupont", u"Wu"]
+    pool = []
+    for number in range(distinct):
+        suffix = "".join(chr(ord("a") + int(digit)) for digit in str(number))
+        pool.append(u"%s %s%s%s" % (rand.choice(forenames), rand.choice(surnames),
+                                    suffix, rand.choice(["", "", "1", "2,3"])))
+    names = [rand.choice(pool) for _ in range(count)]
+
+    timings = {}
+    for func in (legacy.legacy_split_fullname, utils.split_fullname):
+        timings[func] = min(timeit.repeat(
+            lambda: [func(name, False) for name in names], number=1, repeat=repeat))
+        print("%-22s %8.3f s  %8.0f names/s"
+              % (func.__name__, timings[func], count / timings[func]))
+    print("Speed-up: %.1fx" % (timings[legacy.legacy_split_fullname]
+                               / timings[utils.split_fullname]))
+
+
+def bench_filenames(count=50000, repeat=3, seed=0):
+    """Compare `filenames.classify` with `tests.legacy.legacy_classify`.
+
+    The timing classifies `count` different names of an archive tree, once
+    with an empty cache and once again, like a second scan does.
+    """
+    for filename, expected in fixtures.FILENAME_FIXTURES:
+        result = filenames.classify(filename)
+        if result != expected:
+            raise AssertionError("%r gives %r instead of %r"
+                                 % (filename, result, expected))
+        groups = legacy.legacy_classify(filename)
+        if expected[0] and groups and len(groups) == 2 and groups != expected[:2]:
+            raise AssertionError("%r gives %r, the legacy loop %r"
+                                 % (filename, result, groups))
+    print("Classification right for %i fixture names"
+          % len(fixtures.FILENAME_FIXTURES))
+
+    rand = random.Random(seed)
+    names = []
+    for number in range(count):
+        cnum = "C%02i-%02i-%02i" % (rand.randint(70, 99), rand.randint(1, 12),
+                                    rand.randint(1, 28))
+        if rand.random() < 0.2:
+            cnum += ".%i" % rand.randint(1, 3)
+        fpage = 1 + number
+        names.append(rand.choice([
+            "Pages_from_%s_%i.pdf" % (cnum, fpage),
+            "Pages_from_%s_%i-%i.pdf" % (cnum, fpage, fpage + 9),
+            "Pages_from_%s_%i.pdf" % (cnum, fpage),
+            "%s_Proceedings.pdf" % cnum,
+            "scan%05i.pdf" % number,
+            ]))
+
+    timings = [
+        ("legacy_classify", min(timeit.repeat(
+            lambda: [legacy.legacy_classify(name) for name in names],
+            number=1, repeat=repeat))),
+        ("classify", min(timeit.repeat(
+            lambda: [filenames.classify(name) for name in names],
+            setup=filenames.classify.cache_clear, number=1, repeat=repeat))),
+        ("classify (cached)", min(timeit.repeat(
+            lambda: [filenames.classify(name) for name in names],
+            number=1, repeat=repeat))),
+        ]
+    for name, seconds in timings:
+        print("%-22s %8.3f s  %8.0f names/s" % (name, seconds, count / seconds))
+    print("Speed-up: %.1fx, %.1fx cached" % (timings[0][1] / timings[1][1],
+                                            timings[0][1] / timings[2][1]))
+
+
+def load_script():
+    """Import `grobid_proceedings.py`, which the package name shadows."""
+    return imp.load_source("grobid_proceedings_script", SCRIPT)
+
+
+def make_pdf_dir(directory, count, size, cnum="C99-01-01", seed=0):
+    """Create `count` fake contribution pdfs of about `size` bytes."""
+    rand = random.Random(seed)
+    cnum_dir = os.path.join(directory, cnum)
+    os.makedirs(cnum_dir)
+    for number in range(count):
+        filename = "Pages_from_%s_%i.pdf" % (cnum, 1 + 10 * number)
+        with open(os.path.join(cnum_dir, filename), "wb") as pfile:
+            pfile.write(b"%PDF-1.4\n")
+            pfile.write(os.urandom(rand.randint(size // 2, size * 3 // 2)))
+    return cnum_dir
+
+
+def bench_pipeline(count=200, workers=8, processes=1, latency=0.1, error_rate=0.0,
+                   max_concurrency=10, size=100000, adaptive=False, backends=1):
+    """Run `build_marc_xml` on `count` synthetic pdfs against a stub Grobid.
+
+    With `adaptive`, the number of concurrent requests is adjusted by a
+    `concurrency.AdaptiveLimit` of at most `workers`. With `backends` > 1,
+    that many stub servers are started behind a `balancer.GrobidBalancer`.
+    """
+    script = load_script()
+    servers = [stubserver.StubGrobidServer(
+        latency=latency, error_rate=error_rate,
+        max_concurrency=max_concurrency).start() for _ in range(backends)]
+    limits = [concurrency.AdaptiveLimit(workers) if adaptive else None
+              for _ in servers]
+    if backends > 1:
+        script.GROBID = balancer.GrobidBalancer(
+            [client.GrobidClient(server.url, pool_size=workers, retries=0,
+                                 limit=limit)
+             for server, limit in zip(servers, limits)],
+            backoff=0.1, max_backoff=1)
+    else:
+        script.GROBID = client.GrobidClient(
+            servers[0].url, pool_size=workers, backoff=0.1, max_backoff=1,
+            limit=limits[0])
+    script.TEI_CACHE = None
+
+    directory = tempfile.mkdtemp(prefix="grobid_benchmark_")
+    stdout = sys.stdout
+    try:
+        input_dir = make_pdf_dir(directory, count, size)
+        sys.stdout = open(os.devnull, "w")  # Every record is printed
+        logging.disable(logging.INFO)  # and logged
+        script.build_marc_xml(input_dir, "2016", separate=False,
+                              workers=workers, processes=processes)
+    finally:
+        logging.disable(logging.NOTSET)
+        if sys.stdout is not stdout:
+            sys.stdout.close()
+            sys.stdout = stdout
+        script.GROBID.close()
+        for server in servers:
+            server.stop()
+        shutil.rmtree(directory)
+
+    report = script.METRICS.report()
+    rss_self = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    print("Files:             %i (%i workers, %i processes, %i failed)"
+          % (count, workers, processes, len(script.grobid_likes_not)))
+    print("Stub Grobid:       %i x %.3f s latency, %.0f %% errors, %i concurrent, "
+          "%i requests, %i retries" % (backends, latency, 100 * error_rate,
+                                       max_concurrency,
+                                       sum(server.requests for server in servers),
+                                       report["retries"]))
+    print("Total:             %.2f s, %.1f files/s"
+          % (report["duration"], report["files_per_second"]))
+    if adaptive:
+        print("Adaptive limit:    %s at the end"
+              % ", ".join(str(int(limit.limit)) for limit in limits))
+    print("Peak RSS:          %.1f MB (largest child %.1f MB)"
+          % (rss_self / 1024.0, rss_children / 1024.0))
+    print("Stage                     total      p50      p95      max")
+    for stage in metrics.STAGES:
+        if stage in report["stages"]:
+            values = report["stages"][stage]
+            print("%-20s %8.3f s %8.4f %8.4f %8.4f" % (
+                stage, values["total"], values["p50"], values["p95"], values["max"]))
+
+
+BENCHMARKS = {
+    "filenames": bench_filenames,
+    "mapping": bench_mapping,
+    "names": bench_names,
+    "pipeline": bench_pipeline,
+    "serializer": bench_serializer,
+    }
+
+OPTIONS = {
+    "-n": ("count", int),
+    "-w": ("workers", int),
+    "-j": ("processes", int),
+    "-l": ("latency", float),
+    "-e": ("error_rate", float),
+    "-c": ("max_concurrency", int),
+    "-s": ("size", int),
+    "-a": ("adaptive", lambda arg: True),
+    "-b": ("backends", int),
+    }
+
+
+def main(argv):
+    """Run the benchmark named in `argv`."""
+    helptext = ("Usage: python -m grobid_proceedings.benchmark <benchmark> "
+                "[-n <count>] [-w <workers>] [-j <processes>] [-l <latency>] "
+                "[-e <error rate>] [-c <max concurrency>] [-s <pdf size>] [-a] [-b <backends>]\n"
+                "Benchmarks: " + ", ".join(sorted(BENCHMARKS)))
+    if not argv or argv[0] not in BENCHMARKS:
+        print(helptext)
+        sys.exit(2)
+    try:
+        opts, args = getopt.getopt(argv[1:], "n:w:j:l:e:c:s:ab:")
+    except getopt.GetoptError:
+        print(helptext)
+        sys.exit(2)
+    kwargs = {}
+    for opt, arg in opts:
+        name, convert = OPTIONS[opt]
+        kwargs[name] = convert(arg)
+    BENCHMARKS[argv[0]](**kwargs)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
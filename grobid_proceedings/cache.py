@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016 CERN.
+
+"""On-disk cache of Grobid TEI results.
+
+Entries are keyed by the SHA-256 of the pdf contents together with the Grobid
+service url and version, so an unchanged pdf is never sent to the same Grobid
+twice. The cache is a plain directory, one file per entry, and the least
+recently used entries are removed when it grows over `max_size` bytes.
+"""
+
+from __future__ import absolute_import
+
+import hashlib
+import io
+import logging
+import os
+import threading
+
+from grobid_proceedings.utils import AtomicFile
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIR = os.path.expanduser("~/.cache/grobid_proceedings")
+DEFAULT_MAX_SIZE = 2 * 1024 ** 3  # 2 GB
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path):
+    """Return the SHA-256 hex digest of a file, read in chunks."""
+    sha = hashlib.sha256()
+    with open(path, "rb") as pfile:
+        for chunk in iter(lambda: pfile.read(CHUNK_SIZE), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class TEICache(object):
+    """Directory of TEI files keyed by pdf hash and Grobid endpoint."""
+
+    def __init__(self, directory=DEFAULT_DIR, max_size=DEFAULT_MAX_SIZE,
+                 rebuild=False):
+        """
+        :param directory: where the TEI files are stored
+        :param max_size: size limit in bytes, older entries are evicted
+        :param rebuild: ignore the existing entries but store the new results
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.rebuild = rebuild
+        self.size = None
+        self.lock = threading.Lock()
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    @staticmethod
+    def key(pdf_digest, *namespace):
+        """Return the cache key of a pdf for e.g. the Grobid url and version."""
+        parts = [pdf_digest] + [part or "" for part in namespace]
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        """Return the path of the entry `key`."""
+        return os.path.join(self.directory, key[:2], key + ".tei.xml")
+
+    def get(self, key):
+        """Return the cached TEI of `key` or None."""
+        if self.rebuild:
+            return None
+        path = self.path(key)
+        try:
+            with io.open(path, "r", encoding="utf-8") as tfile:
+                tei = tfile.read()
+        except (IOError, OSError):
+            return None
+        try:
+            os.utime(path, None)  # Mark as recently used
+        except OSError:
+            pass
+        return tei
+
+    def put(self, key, tei):
+        """Store the TEI of `key`, replacing an existing entry atomically."""
+        path = self.path(key)
+        data = tei.encode("utf-8")
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        with AtomicFile(path, "wb") as tfile:
+            tfile.write(data)
+        with self.lock:
+            if self.size is None:
+                self.size = self.disk_usage()
+            else:
+                self.size += len(data) - old_size
+            if self.size > self.max_size:
+                self.evict()
+
+    def entries(self):
+        """Return (mtime, size, path) of every entry."""
+        entries = []
+        for root, dirnames, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if not filename.endswith(".tei.xml"):
+                    continue
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def disk_usage(self):
+        """Return the total size of the entries in bytes."""
+        return sum(size for (mtime, size, path) in self.entries())
+
+    def evict(self):
+        """Remove least recently used entries until the cache is at 90 % of `max_size`."""
+        target = self.max_size * 0.9
+        removed = 0
+        for mtime, size, path in sorted(self.entries()):
+            if self.size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.size -= size
+            removed += 1
+        logger.info("Evicted %i entries from the TEI cache %s"
+                    % (removed, self.directory))
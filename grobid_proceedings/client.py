@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016 CERN.
+
+"""HTTP client for the Grobid service.
+
+One `GrobidClient` keeps a pooled keep-alive session to one Grobid server,
+so consecutive pdfs reuse the same TCP connections. Every request has a
+connect and a read timeout. Grobid answers 503 on purpose when it is
+overloaded; these answers, timeouts and broken connections are retried with
+exponential backoff before giving up. Every failure surfaces as a
+`GrobidError`.
+
+Pdfs are uploaded from open binary files with `MultipartFile`, which streams
+the multipart body in blocks, so memory use does not grow with the size of
+the pdf.
+"""
+
+from __future__ import absolute_import
+
+import io
+import logging
+import os
+import random
+import time
+import uuid
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from six.moves.urllib.parse import urljoin
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "http://inspire-grobid.cern.ch:8080/"
+#DEFAULT_HOST = "http://localhost:8080/"  # Local installation
+
+FULLTEXT_SERVICE = "processFulltextDocument"
+HEADER_SERVICE = "processHeaderDocument"
+
+RETRY_STATUS_CODES = (503, )
+
+# Transport errors worth another attempt; a connection reset while the answer
+# is read is a ChunkedEncodingError. Other request errors are not retried.
+RETRY_EXCEPTIONS = (
+    requests.exceptions.Timeout,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.ChunkedEncodingError,
+    )
+
+BLOCK_SIZE = 64 * 1024
+
+
+class GrobidError(Exception):
+    """Grobid could not process a document."""
+
+    def __init__(self, message, status_code=None):
+        super(GrobidError, self).__init__(message)
+        self.status_code = status_code
+
+
+def backoff_delay(attempt, backoff, max_backoff, response=None):
+    """Return the seconds to wait before retry number `attempt`.
+
+    The delay doubles with every attempt, is at least the Retry-After of the
+    `response`, and has some jitter so that concurrent workers do not retry
+    in lockstep.
+    """
+    delay = min(backoff * 2 ** attempt, max_backoff)
+    retry_after = response is not None and response.headers.get("Retry-After")
+    if retry_after and retry_after.isdigit():
+        delay = max(delay, int(retry_after))
+    return delay * random.uniform(0.5, 1)
+
+
+class MultipartFile(object):
+    """File-like multipart/form-data body with one file field.
+
+    The file is read in blocks while the body is sent instead of being
+    loaded into memory. `len` is the size of the whole body, so that
+    requests sends a Content-Length header. The seconds spent reading the
+    file add up in `read_seconds`, to tell them apart from the time Grobid
+    takes.
+
+    :param fileobj: seekable file object opened in binary mode
+    :param field: name of the form field
+    :param filename: file name sent with the field
+    """
+
+    def __init__(self, fileobj, field="input", filename="input.pdf",
+                 content_type="application/pdf"):
+        if isinstance(filename, bytes):
+            filename = filename.decode("utf-8", "replace")
+        boundary = uuid.uuid4().hex
+        self.content_type = "multipart/form-data; boundary=" + boundary
+        head = ('--%s\r\nContent-Disposition: form-data; name="%s"; '
+                'filename="%s"\r\nContent-Type: %s\r\n\r\n'
+                % (boundary, field, filename.replace('"', ""), content_type))
+        head = head.encode("utf-8")
+        tail = ("\r\n--%s--\r\n" % boundary).encode("utf-8")
+        fileobj.seek(0, os.SEEK_END)
+        size = fileobj.tell()
+        fileobj.seek(0)
+        self.len = len(head) + size + len(tail)
+        self.fileobj = fileobj
+        self.parts = [io.BytesIO(head), fileobj, io.BytesIO(tail)]
+        self.read_seconds = 0.0
+
+    def read(self, size=-1):
+        """Read up to `size` bytes of the body, everything if `size` < 0."""
+        chunks = []
+        while self.parts and (size < 0 or size > 0):
+            if self.parts[0] is self.fileobj:
+                start = time.time()
+                chunk = self.fileobj.read(size)
+                self.read_seconds += time.time() - start
+            else:
+                chunk = self.parts[0].read(size)
+            if not chunk:
+                self.parts.pop(0)
+                continue
+            chunks.append(chunk)
+            if size > 0:
+                size -= len(chunk)
+        return b"".join(chunks)
+
+    def __iter__(self):
+        return iter(lambda: self.read(BLOCK_SIZE), b"")
+
+
+class GrobidClient(object):
+    """Pooled connection to one Grobid server."""
+
+    def __init__(self, host=DEFAULT_HOST, connect_timeout=10, read_timeout=300,
+                 retries=5, backoff=2, max_backoff=120, pool_size=10, limit=None):
+        """
+        :param host: base url of the Grobid server
+        :param connect_timeout: seconds to wait for the connection
+        :param read_timeout: seconds to wait for Grobid to answer
+        :param retries: how many times a 503, a timeout or a broken
+            connection is retried
+        :param backoff: seconds to wait before the first retry, doubled after
+            every retry
+        :param max_backoff: upper limit for the wait between retries
+        :param pool_size: number of keep-alive connections, should be at least
+            the number of concurrent requests
+        :param limit: `concurrency.AdaptiveLimit` for the number of requests
+            in flight, which is adjusted to 503s, timeouts and the latency
+        """
+        self.host = host
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.limit = limit
+        self._version = None
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        """Close the pooled connections."""
+        self.session.close()
+
+    def url(self, service):
+        """Return the url of a Grobid service, e.g. `processFulltextDocument`."""
+        return urljoin(self.host, service)
+
+    def version(self):
+        """Return the Grobid version string, or '' if the server does not tell."""
+        if self._version is None:
+            try:
+                response = self.session.get(
+                    self.url("api/version"), timeout=self.timeout)
+                self._version = response.text.strip() if response.ok else ""
+            except requests.exceptions.RequestException:
+                return ""
+        return self._version
+
+    def is_alive(self):
+        """Return True if the server answers `api/isalive`."""
+        try:
+            response = self.session.get(
+                self.url("api/isalive"), timeout=self.timeout[0])
+        except requests.exceptions.RequestException:
+            return False
+        return response.ok
+
+    def wait(self, attempt, response=None):
+        """Sleep before retry number `attempt`."""
+        time.sleep(backoff_delay(attempt, self.backoff, self.max_backoff, response))
+
+    def post(self, service, pdf, filename=None, stats=None):
+        """Post one pdf to a Grobid service and return the response text.
+
+        `pdf` is a seekable binary file object, which is streamed and
+        rewound for every attempt, or the content of the pdf as bytes.
+        Raise `GrobidError` if Grobid did not return 200 after all retries,
+        or at once for a request error which is not a timeout or a broken
+        connection (e.g. an answer which cannot be decoded).
+        If `stats` is a dictionary, the status code (or exception name) of
+        every attempt goes to its `status_codes` list, the number of
+        retries to `retries` and the seconds spent reading `pdf` to
+        `read_seconds`.
+        """
+        if stats is None:
+            stats = {}
+        stats.setdefault("status_codes", [])
+        stats["retries"] = 0
+        stats.setdefault("read_seconds", 0.0)
+        if isinstance(pdf, bytes):
+            pdf = io.BytesIO(pdf)
+        url = self.url(service)
+        upload_name = os.path.basename(filename or "input.pdf")
+        attempt = 0
+        while True:
+            response = None
+            body = MultipartFile(pdf, filename=upload_name)
+            latency = overload = None
+            started = self.limit.acquire() if self.limit else time.time()
+            try:
+                response = self.session.post(
+                    url,
+                    data=body,
+                    headers={"Content-Type": body.content_type},
+                    timeout=self.timeout,
+                    )
+            except RETRY_EXCEPTIONS as err:
+                stats["status_codes"].append(err.__class__.__name__)
+                error = GrobidError("%s: %s" % (err.__class__.__name__, err))
+                if isinstance(err, requests.exceptions.Timeout):
+                    overload = err.__class__.__name__
+            except requests.exceptions.RequestException as err:
+                stats["status_codes"].append(err.__class__.__name__)
+                raise GrobidError("%s: %s" % (err.__class__.__name__, err))
+            else:
+                stats["status_codes"].append(response.status_code)
+                if response.status_code == 200:
+                    latency = time.time() - started
+                    return response.text
+                error = GrobidError(
+                    "Grobid server error, status code: %i" % response.status_code,
+                    status_code=response.status_code,
+                    )
+                if response.status_code not in RETRY_STATUS_CODES:
+                    raise error
+                overload = "status code %i" % response.status_code
+            finally:
+                stats["read_seconds"] += body.read_seconds
+                if self.limit:
+                    self.limit.release(started, latency, overload)
+            if attempt >= self.retries:
+                raise error
+            logger.info("%s, retrying %s (%i/%i)"
+                        % (error, filename or url, attempt + 1, self.retries))
+            self.wait(attempt, response)
+            attempt += 1
+            stats["retries"] = attempt
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016 CERN.
+
+"""Small helpers for running Grobid requests and conversions concurrently."""
+
+from __future__ import absolute_import
+
+import logging
+import multiprocessing
+import sys
+import threading
+import time
+
+from six import reraise
+from six.moves import queue
+
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+def imap_unordered(func, iterable, max_workers):
+    """Apply `func` to every item of `iterable` using `max_workers` threads.
+
+    Results are yielded as soon as they are ready, so the order is not
+    preserved. At most `max_workers` calls are in flight at the same time and
+    `iterable` is consumed lazily, so work starts before the input has been
+    fully read. An exception raised by `func` is re-raised in the caller.
+    """
+    tasks = queue.Queue(maxsize=max_workers)
+    results = queue.Queue()
+    stop = threading.Event()
+
+    def feed():
+        try:
+            for item in iterable:
+                if stop.is_set():
+                    break
+                tasks.put(item)
+        except Exception:
+            results.put((False, sys.exc_info()))
+        finally:
+            for _ in range(max_workers):
+                tasks.put(_DONE)
+
+    def work():
+        while True:
+            item = tasks.get()
+            if item is _DONE:
+                results.put((True, _DONE))
+                return
+            if stop.is_set():
+                continue
+            try:
+                results.put((True, func(item)))
+            except Exception:
+                results.put((False, sys.exc_info()))
+
+    threads = [threading.Thread(target=feed)]
+    threads += [threading.Thread(target=work) for _ in range(max_workers)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    finished = 0
+    try:
+        while finished < max_workers:
+            ok, value = results.get()
+            if not ok:
+                reraise(*value)
+            if value is _DONE:
+                finished += 1
+            else:
+                yield value
+    finally:
+        stop.set()
+
+
+def process_imap(func, iterable, processes, max_pending=None):
+    """Apply `func` to every item of `iterable` in a pool of `processes`.
+
+    This is for CPU bound work. Results are yielded in the order of
+    `iterable`. The items are read and submitted from a separate thread, so
+    results that are ready are never held back while the next item is
+    awaited. At most `max_pending` items (default twice the number of
+    processes) are submitted but not yet yielded. `func` and the items must
+    be picklable.
+    """
+    max_pending = max_pending or 2 * processes
+    pool = multiprocessing.Pool(processes)
+    submitted = queue.Queue(maxsize=max_pending)
+    stop = threading.Event()
+
+    def feed():
+        try:
+            for item in iterable:
+                if stop.is_set():
+                    break
+                submitted.put((True, pool.apply_async(func, (item, ))))
+        except Exception:
+            submitted.put((False, sys.exc_info()))
+        finally:
+            submitted.put((True, _DONE))
+
+    feeder = threading.Thread(target=feed)
+    feeder.daemon = True
+    feeder.start()
+    try:
+        while True:
+            ok, value = submitted.get()
+            if not ok:
+                reraise(*value)
+            if value is _DONE:
+                break
+            while not value.ready():
+                value.wait(1)  # A timeout keeps this interruptible
+            yield value.get()
+        pool.close()
+    finally:
+        stop.set()
+        pool.terminate()
+        pool.join()
+
+
+class AdaptiveLimit(object):
+    """Limit of concurrent requests adjusted by AIMD to the server's capacity.
+
+    Until the first pushback the limit grows by one for every answer (slow
+    start). After that, it grows by one for every `limit` answers that come
+    back without a latency increase (additive increase), and is cut by `decrease` when the
+    server pushes back with a 503, a timeout or a latency over `tolerance`
+    times the baseline (multiplicative decrease). Signals of requests started
+    before the last cut are ignored, as that cut has already reacted to them.
+    The baseline is the lowest latency seen, which slowly drifts up to follow
+    the typical latency.
+
+    :param max_limit: upper bound of the limit, e.g. the number of workers
+    :param min_limit: lower bound of the limit
+    :param initial: starting limit, by default the lower bound
+    :param decrease: factor applied to the limit on pushback
+    :param tolerance: latency over this many times the baseline is pushback
+    """
+
+    def __init__(self, max_limit, min_limit=1, initial=None, decrease=0.5,
+                 tolerance=2.0):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(initial or min_limit)
+        self.decrease = decrease
+        self.tolerance = tolerance
+        self.in_flight = 0
+        self.baseline = None
+        self.latency = None
+        self.last_decrease = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """Block until a request may be sent, return its start time."""
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+        return time.time()
+
+    def release(self, started, latency=None, overload=None):
+        """End the request started at `started`.
+
+        Pass the `latency` of a successful answer or the reason of an
+        `overload`; with neither the limit is not changed.
+        """
+        with self.condition:
+            self.in_flight -= 1
+            if overload:
+                self.cut(started, overload)
+            elif latency is not None:
+                self.measure(started, latency)
+            self.condition.notify_all()
+
+    def measure(self, started, latency):
+        """Adjust the limit to the latency of a successful answer."""
+        if self.baseline is None or latency < self.baseline:
+            self.baseline = latency
+        else:
+            self.baseline += (latency - self.baseline) * 0.01
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += (latency - self.latency) * 0.2
+        if self.latency > self.tolerance * self.baseline:
+            self.cut(started, "latency %.2f s over %.1fx the baseline %.2f s"
+                     % (self.latency, self.tolerance, self.baseline))
+        elif self.limit < self.max_limit:
+            old = int(self.limit)
+            step = 1 if not self.last_decrease else 1 / self.limit
+            self.limit = min(self.limit + step, self.max_limit)
+            if int(self.limit) != old:
+                logger.info("Grobid concurrency limit %i -> %i: stable latency "
+                            "%.2f s" % (old, int(self.limit), self.latency))
+
+    def cut(self, started, reason):
+        """Decrease the limit because of pushback."""
+        if started < self.last_decrease:
+            return
+        self.last_decrease = time.time()
+        old = int(self.limit)
+        self.limit = max(self.limit * self.decrease, self.min_limit)
+        # Measure the latency afresh at the new limit:
+        self.latency = self.baseline
+        logger.info("Grobid concurrency limit %i -> %i: %s"
+                    % (old, int(self.limit), reason))
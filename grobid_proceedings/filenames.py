@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016 CERN.
+
+"""Classification of the pdf file names.
+
+The cnum and the pages of a contribution are only known from its file name,
+e.g. `Pages_from_C12-03-10_11.pdf` or `Pages_from_C88-03-06.1_79-89.pdf`.
+All the known forms are matched at once by `FILENAME_PATTERN`, one regex
+with named groups, and `classify` returns a `FileName` with the cnum, the
+first and last page and the kind of the file. The results are memoized, as
+the same names are classified several times in a run (scanning, grouping,
+ordering) and again in every refresh of `--watch`.
+"""
+
+from __future__ import absolute_import
+
+import collections
+import re
+
+
+CONTRIBUTION = "contribution"
+PROCEEDINGS = "proceedings"
+UNKNOWN = "unknown"
+
+# Classification of a file name. The pages are strings, like in the records;
+# `lpage` is None without a page range, everything but `kind` is None for
+# UNKNOWN and the pages for PROCEEDINGS.
+FileName = collections.namedtuple("FileName", ["cnum", "fpage", "lpage", "kind"])
+
+# e.g. C12-03-10 or C88-03-06.1
+CNUM = r'C\d\d-\d\d-\d\d(?:\.\d+)?'
+
+# Please remove whitespaces from filenames first.
+FILENAME_PATTERN = re.compile(
+    r'^(?:'
+    # Contributions, e.g. Pages_from_C75-03-02_101.pdf, Pages_from_C88-01-23_15-24.pdf
+    # or Pages_from_C88-03-06.1_79-89.pdf
+    r'Pages_from_(?P<cnum>' + CNUM + r')[-_](?P<fpage>\d+)(?:-(?P<lpage>\d+))?'
+    # Proceedings, e.g. C73-03-04_Proceedings.pdf or C73-03-04.pdf
+    r'|(?P<proceedings>' + CNUM + r')(?:[-_]Proceedings)?'
+    r')\.pdfa?$')
+
+# Distinct file names remembered by `classify`
+FILENAME_CACHE_SIZE = 100000
+
+_UNKNOWN = FileName(None, None, None, UNKNOWN)
+
+# Builds a `FileName` from a tuple without the Python level `__new__` of the
+# namedtuple, which would make a first pass slower than the legacy loop
+_new_filename = tuple.__new__
+
+# A plain dictionary, `utils.lru_cache` costs more than the regex itself
+_cache = {}
+
+
+def classify(filename):
+    """Return the `FileName` of a pdf file name, without the directory."""
+    parsed = _cache.get(filename)
+    if parsed is None:
+        match = FILENAME_PATTERN.match(filename)
+        if match is None:
+            parsed = _UNKNOWN
+        else:
+            cnum, fpage, lpage, proceedings = match.groups()
+            if proceedings is None:
+                parsed = _new_filename(FileName, (cnum, fpage, lpage, CONTRIBUTION))
+            else:
+                parsed = _new_filename(FileName, (proceedings, None, None, PROCEEDINGS))
+        if len(_cache) >= FILENAME_CACHE_SIZE:
+            _cache.clear()
+        _cache[filename] = parsed
+    return parsed
+
+classify.cache_clear = _cache.clear
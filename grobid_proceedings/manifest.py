@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016 CERN.
+
+"""Progress manifest for resumable runs.
+
+The manifest is a JSON lines file in the output directory. Every processed pdf
+appends one line with its path, size, mtime, SHA-256 digest, status and the
+location of the produced record, and the line is flushed to disk right away.
+Records that go to a combined file are stored in the manifest itself, so they
+survive an interrupted run and the combined file can be rebuilt from them.
+
+When a run is restarted, the pdfs that were already done and have not changed
+since are skipped; failed, modified and new pdfs are processed again. Size and
+mtime are compared first, the digest only when they differ, so touching or
+copying a pdf does not make it look modified. Entries of pdfs which no longer
+exist are dropped with `prune`.
+"""
+
+from __future__ import absolute_import
+
+import json
+import os
+import threading
+
+from grobid_proceedings.cache import file_digest
+from grobid_proceedings.utils import AtomicFile
+
+
+FILENAME = "manifest.jsonl"
+
+DONE = "done"
+FAILED = "failed"
+
+
+def file_stat(path):
+    """Return (size, mtime) of a file."""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime
+
+
+class Manifest(object):
+    """Append-only log of the processed pdfs of one output directory."""
+
+    def __init__(self, output_dir, resume=True, stat=file_stat):
+        """
+        :param output_dir: directory where the manifest file is kept
+        :param resume: load the existing manifest, otherwise start a new one
+        :param stat: function returning (size, mtime) of a pdf, when recording
+            it and checking whether it changed, e.g. of a `scanner.StatCache`
+        """
+        self.path = os.path.join(output_dir, FILENAME)
+        self.stat = stat
+        self.entries = {}
+        self.lock = threading.Lock()
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        if resume:
+            self.load()
+        self.compact()
+        self.mfile = open(self.path, "a")
+
+    def load(self):
+        """Read the entries, the last line of every pdf wins."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r") as mfile:
+            for line in mfile:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Last line of an interrupted run
+                self.entries[entry["path"]] = entry
+
+    def compact(self):
+        """Rewrite the manifest with one line per pdf."""
+        with AtomicFile(self.path) as mfile:
+            for entry in self.entries.values():
+                mfile.write(json.dumps(entry, sort_keys=True) + "\n")
+
+    def is_done(self, pdf_path, **settings):
+        """Return True if `pdf_path` was processed and has not changed since.
+
+        `settings` are values the entry must have been recorded with, e.g.
+        the pubdate of the records.
+        """
+        pdf_path = os.path.abspath(pdf_path)
+        entry = self.entries.get(pdf_path)
+        if not entry or entry["status"] != DONE:
+            return False
+        if any(entry.get(key) != value for key, value in settings.items()):
+            return False
+        if ("marcxml" not in entry and entry.get("output")
+                and not os.path.exists(entry["output"])):
+            return False
+        try:
+            size, mtime = self.stat(pdf_path)
+        except OSError:
+            return False
+        if entry["size"] == size and entry["mtime"] == mtime:
+            return True
+        if entry["size"] != size or not entry.get("sha256"):
+            return False
+        if file_digest(pdf_path) != entry["sha256"]:
+            return False
+        # Same content, remember the new mtime so it is not hashed again
+        self.write(dict(entry, mtime=mtime))
+        return True
+
+    def done(self):
+        """Return the entries of the finished pdfs."""
+        return [entry for entry in self.entries.values()
+                if entry["status"] == DONE]
+
+    def prune(self, pdf_paths):
+        """Drop the entries of the pdfs not in `pdf_paths`.
+
+        Separate record files of the dropped pdfs are removed. Return the
+        dropped entries.
+        """
+        keep = set(os.path.abspath(pdf_path) for pdf_path in pdf_paths)
+        with self.lock:
+            dropped = [entry for path, entry in self.entries.items()
+                       if path not in keep]
+            for entry in dropped:
+                del self.entries[entry["path"]]
+            outputs = set(entry.get("output") for entry in self.entries.values())
+            for entry in dropped:
+                output = entry.get("output")
+                if (output and "marcxml" not in entry and output not in outputs
+                        and os.path.exists(output)):
+                    os.remove(output)
+            if dropped:
+                self.mfile.close()
+                self.compact()
+                self.mfile = open(self.path, "a")
+        return dropped
+
+    def record(self, pdf_path, status, output=None, sha256=None, **extra):
+        """Add an entry for `pdf_path` and flush it to disk.
+
+        `sha256` is the digest of the pdf if it is already known, otherwise
+        the pdf is read to compute it. Size and mtime are those of `stat`,
+        the same values `is_done` compares them with.
+        """
+        pdf_path = os.path.abspath(pdf_path)
+        size, mtime = self.stat(pdf_path)
+        self.write(dict(extra, path=pdf_path, size=size, mtime=mtime,
+                        sha256=sha256 or file_digest(pdf_path), status=status,
+                        output=output))
+
+    def write(self, entry):
+        """Append `entry` to the manifest and flush it to disk."""
+        pdf_path = entry["path"]
+        with self.lock:
+            self.mfile.write(json.dumps(entry, sort_keys=True) + "\n")
+            # The record itself is only needed when the manifest is loaded:
+            entry.pop("marcxml", None)
+            self.entries[pdf_path] = entry
+            self.mfile.flush()
+            os.fsync(self.mfile.fileno())
+
+    def close(self):
+        """Close the manifest file."""
+        self.mfile.close()
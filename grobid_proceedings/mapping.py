@@ -22,7 +22,13 @@
 # waive the privileges and immunities granted to it by virtue of its status
 # as an Intergovernmental Organization or submit itself to any jurisdiction.
 
-"""Mapping from Grobid's TEI to the internal dict representation."""
+"""Mapping from Grobid's TEI to the internal record representation.
+
+`root_to_record` builds a `Record` with `Author` and `Affiliation` objects.
+These have `__slots__`, so a record of a collaboration paper with hundreds
+of authors takes a fraction of the memory of the equivalent nested dicts.
+`Record.to_dict` gives the dict shape of `root_to_dict`.
+"""
 
 from lxml import etree
 from six import text_type
@@ -31,72 +37,206 @@ from six import text_type
 NS = {'tei': 'http://www.tei-c.org/ns/1.0'}
 
 
-def tei_to_dict(tei):
+def _xpath(path):
+    """Compile an XPath expression once, instead of at every call."""
+    return etree.XPath(path, namespaces=NS)
+
+
+ABSTRACT = _xpath('//tei:profileDesc/tei:abstract/tei:p')
+AUTHORS = _xpath('//tei:fileDesc//tei:author')
+KEYWORDS = _xpath('//tei:profileDesc/tei:textClass/tei:keywords')
+REFERENCES = _xpath('//tei:text//tei:listBibl/tei:biblStruct')
+TITLE = _xpath('//tei:titleStmt/tei:title')
+
+NAME_PARTS = _xpath('.//tei:persName/tei:forename | .//tei:persName/tei:surname')
+AFFILIATIONS = _xpath('.//tei:affiliation')
+INSTITUTIONS = _xpath('.//tei:orgName[@type="institution"]')
+TERMS = _xpath('.//tei:term')
+
+REFERENCE_AUTHORS = _xpath('.//tei:author')
+REFERENCE_TITLE = _xpath(
+    './/tei:analytic/tei:title[@level="a" and @type="main"]')
+JOURNAL_TITLE = _xpath('./tei:monogr/tei:title')
+BIBL_SCOPES = _xpath('./tei:monogr/tei:imprint/tei:biblScope')
+PUBLISHED = _xpath('./tei:monogr/tei:imprint/tei:date[@type="published"]/@when')
+
+FORENAME = '{%s}forename' % NS['tei']
+SURNAME = '{%s}surname' % NS['tei']
+
+
+class Affiliation(object):
+    """Institution of an author."""
+
+    __slots__ = ('value', )
+
+    def __init__(self, value=None):
+        self.value = value
+
+    def to_dict(self):
+        return {'value': self.value}
+
+
+class Author(object):
+    """Name and affiliations of an author."""
+
+    __slots__ = ('name', 'affiliations')
+
+    def __init__(self, name='', affiliations=()):
+        self.name = name
+        self.affiliations = tuple(affiliations)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'affiliations': [aff.to_dict() for aff in self.affiliations],
+        }
+
+    @classmethod
+    def from_dict(cls, dic):
+        return cls(dic.get('name', ''),
+                   [Affiliation(aff.get('value'))
+                    for aff in dic.get('affiliations') or ()])
+
+
+class Record(object):
+    """Record of one pdf, fields which were not found are None.
+
+    `keywords` is a tuple of strings, `authors` of `Author` and `references`
+    a list of dicts (see `element_to_reference`). `pdf_path`, `cnum` and
+    `fpage` are set by the pipeline.
+    """
+
+    __slots__ = ('title', 'abstract', 'authors', 'keywords', 'references',
+                 'pdf_path', 'cnum', 'fpage')
+
+    TEXT_FIELDS = ('title', 'abstract', 'pdf_path', 'cnum', 'fpage')
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    def to_dict(self):
+        """Return the record as a dict, like `root_to_dict` does.
+
+        All the `TEXT_FIELDS` are there, None when they were not found, like
+        in the dicts of the pipeline before the records.
+        """
+        result = dict((name, getattr(self, name)) for name in self.TEXT_FIELDS)
+        if self.authors is not None:
+            result['authors'] = [author.to_dict() for author in self.authors]
+        if self.keywords is not None:
+            result['keywords'] = [{'value': keyword} for keyword in self.keywords]
+        if self.references is not None:
+            result['references'] = self.references
+        return result
+
+    @classmethod
+    def from_dict(cls, dic):
+        """Build a record from the dict of `to_dict`."""
+        record = cls(**dict((name, dic.get(name)) for name in cls.TEXT_FIELDS))
+        if 'authors' in dic:
+            record.authors = tuple(Author.from_dict(author)
+                                   for author in dic['authors'])
+        if 'keywords' in dic:
+            record.keywords = tuple(keyword.get('value')
+                                    for keyword in dic['keywords'])
+        record.references = dic.get('references')
+        return record
+
+
+def tei_to_dict(tei, references=True):
+    """Convert Grobid TEI to a record dict.
+
+    With `references=False` the bibliography is not parsed, e.g. for the
+    output of `processHeaderDocument`, which has none.
+    """
+    return root_to_dict(parse_tei(tei), references)
+
+
+def parse_tei(tei):
+    """Parse Grobid TEI, returning the root element."""
     parser = etree.XMLParser(encoding='UTF-8', recover=True)
     tei = tei if not isinstance(tei, text_type) else tei.encode('utf-8')
-    root = etree.fromstring(tei, parser)
+    return etree.fromstring(tei, parser)
+
+
+def has_header(tei):
+    """Return True if Grobid found a title or authors in the TEI."""
+    try:
+        root = parse_tei(tei)
+    except etree.XMLSyntaxError:
+        return False
+    if root is None:
+        return False
+    return (any(title.text for title in get_title(root))
+            or bool(get_authors(root)))
 
-    result = {}
+
+def root_to_dict(root, references=True):
+    """Convert the root element of parsed TEI to a record dict."""
+    return root_to_record(root, references).to_dict()
+
+
+def root_to_record(root, references=True):
+    """Convert the root element of parsed TEI to a `Record`."""
+    result = Record()
 
     abstract = get_abstract(root)
     if abstract and len(abstract) == 1:
-        result['abstract'] = abstract[0].text
+        result.abstract = abstract[0].text
 
     authors = get_authors(root)
     if authors:
-        result['authors'] = map(element_to_author, authors)
+        result.authors = tuple(element_to_author(author) for author in authors)
 
     keywords = get_keywords(root)
     if keywords and len(keywords) == 1:
-        result['keywords'] = extract_keywords(keywords[0])
+        result.keywords = tuple(term.text for term in TERMS(keywords[0]))
 
     title = get_title(root)
     if title and len(title) == 1:
-        result['title'] = title[0].text
+        result.title = title[0].text
 
-    references = get_references(root)
     if references:
-        result['references'] = map(element_to_reference, references)
+        references = get_references(root)
+        if references:
+            result.references = [element_to_reference(reference)
+                                 for reference in references]
 
     return result
 
 
 def element_to_author(el):
-    result = {}
+    """Return the `Author` of a TEI author element."""
+
+    # All the name parts are fetched with one query and sorted out here.
+    first, middle, surname = [], [], []
+    for part in NAME_PARTS(el):
+        if part.tag == SURNAME:
+            surname.append(part)
+        elif part.tag == FORENAME:
+            name_type = part.get('type')
+            if name_type == 'first':
+                first.append(part)
+            elif name_type == 'middle':
+                middle.append(part)
 
     name = []
-
-    first = el.xpath('.//tei:persName/tei:forename[@type="first"]',
-                     namespaces=NS)
     if first and len(first) == 1:
         name.append(first[0].text)
 
-    middle = el.xpath('.//tei:persName/tei:forename[@type="middle"]',
-                      namespaces=NS)
     if middle and len(middle) == 1:
         name.append(middle[0].text + '.')
 
-    surname = el.xpath('.//tei:persName/tei:surname', namespaces=NS)
     if surname and len(surname) == 1:
         name.append(surname[0].text)
 
-    result['name'] = ' '.join(name)
-
     affiliations = []
-    for aff in el.xpath('.//tei:affiliation', namespaces=NS):
-        for institution in aff.xpath('.//tei:orgName[@type="institution"]',
-                                     namespaces=NS):
-            affiliations.append({
-                'value': institution.text
-            })
+    for aff in AFFILIATIONS(el):
+        for institution in INSTITUTIONS(aff):
+            affiliations.append(Affiliation(institution.text))
 
-    result['affiliations'] = affiliations
-
-    return result
-
-
-def extract_keywords(el):
-    return [{'value': e.text} for e in el.xpath('.//tei:term', namespaces=NS)]
+    return Author(' '.join(name), affiliations)
 
 
 def element_to_reference(el):
@@ -105,7 +245,7 @@ def element_to_reference(el):
     result['ref_title'] = extract_reference_title(el)
 
     result['authors'] = [
-        element_to_author(e) for e in el.xpath('.//tei:author', namespaces=NS)
+        element_to_author(e).to_dict() for e in REFERENCE_AUTHORS(el)
     ]
 
     result['journal_pubnote'] = extract_reference_pubnote(el)
@@ -114,10 +254,7 @@ def element_to_reference(el):
 
 
 def extract_reference_title(el):
-    title = el.xpath(
-        './/tei:analytic/tei:title[@level="a" and @type="main"]',
-        namespaces=NS
-    )
+    title = REFERENCE_TITLE(el)
     if title and len(title) == 1:
         return title[0].text
 
@@ -125,44 +262,36 @@ def extract_reference_title(el):
 def extract_reference_pubnote(el):
     result = {}
 
-    journal_title = el.xpath('./tei:monogr/tei:title', namespaces=NS)
+    journal_title = JOURNAL_TITLE(el)
     if journal_title and len(journal_title) == 1:
         result['journal_title'] = journal_title[0].text
 
-    journal_volume = el.xpath(
-        './tei:monogr/tei:imprint/tei:biblScope[@unit="volume"]',
-        namespaces=NS
-    )
+    # All the biblScopes are fetched with one query and sorted out here.
+    scopes = {'volume': [], 'issue': [], 'page': []}
+    for scope in BIBL_SCOPES(el):
+        unit = scope.get('unit')
+        if unit in scopes:
+            scopes[unit].append(scope)
+
+    journal_volume = scopes['volume']
     if journal_volume and len(journal_volume) == 1:
         result['journal_volume'] = journal_volume[0].text
 
-    journal_issue = el.xpath(
-        './tei:monogr/tei:imprint/tei:biblScope[@unit="issue"]',
-        namespaces=NS
-    )
+    journal_issue = scopes['issue']
     if journal_issue and len(journal_issue) == 1:
         result['journal_issue'] = journal_issue[0].text
 
-    year = el.xpath(
-        './tei:monogr/tei:imprint/tei:date[@type="published"]/@when',
-        namespaces=NS
-    )
+    year = PUBLISHED(el)
     if year and len(year) == 1:
         result['year'] = year[0]
 
     pages = []
 
-    page_from = el.xpath(
-        './tei:monogr/tei:imprint/tei:biblScope[@unit="page"]/@from',
-        namespaces=NS
-    )
+    page_from = [p.get('from') for p in scopes['page'] if p.get('from') is not None]
     if page_from and len(page_from) == 1:
         pages.append(page_from[0])
 
-    page_to = el.xpath(
-        './tei:monogr/tei:imprint/tei:biblScope[@unit="page"]/@to',
-        namespaces=NS
-    )
+    page_to = [p.get('to') for p in scopes['page'] if p.get('to') is not None]
     if page_to and len(page_to) == 1:
         pages.append(page_to[0])
 
@@ -172,21 +301,20 @@ def extract_reference_pubnote(el):
 
 
 def get_abstract(root):
-    return root.xpath('//tei:profileDesc/tei:abstract/tei:p', namespaces=NS)
+    return ABSTRACT(root)
 
 
 def get_authors(root):
-    return root.xpath('//tei:fileDesc//tei:author', namespaces=NS)
+    return AUTHORS(root)
 
 
 def get_keywords(root):
-    return root.xpath('//tei:profileDesc/tei:textClass/tei:keywords',
-                      namespaces=NS)
+    return KEYWORDS(root)
 
 
 def get_references(root):
-    return root.xpath('//tei:text//tei:listBibl/tei:biblStruct', namespaces=NS)
+    return REFERENCES(root)
 
 
 def get_title(root):
-    return root.xpath('//tei:titleStmt/tei:title', namespaces=NS)
+    return TITLE(root)
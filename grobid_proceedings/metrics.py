@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016 CERN.
+
+"""Timings and counters of one pipeline run.
+
+`RunMetrics` collects the duration of every pipeline stage per file, together
+with byte counts, Grobid status codes and retries. At the end of a run it
+can be summarised as a JSON report (`write_report`), for the whole run or
+for the files under one directory, or exported for the Prometheus node
+exporter textfile collector (`write_prometheus`).
+"""
+
+from __future__ import absolute_import
+
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+
+from grobid_proceedings.utils import AtomicFile
+
+
+# Pipeline stages, in order
+SCAN = "scan"
+READ = "pdf_read"
+GROBID = "grobid"
+PARSE = "tei_parse"
+DICT = "dict_build"
+SERIALIZE = "marc_serialization"
+WRITE = "write"
+STAGES = (SCAN, READ, GROBID, PARSE, DICT, SERIALIZE, WRITE)
+
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+
+PROMETHEUS_PREFIX = "grobid_proceedings"
+
+
+def percentile(values, percent):
+    """Return the `percent` percentile of sorted `values` (nearest rank)."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * percent / 100.0))]
+
+
+def histogram(values):
+    """Return cumulative bucket counts of `values` as [(upper bound, count)]."""
+    return [(bound, sum(1 for value in values if value <= bound))
+            for bound in BUCKETS] + [("+Inf", len(values))]
+
+
+class RunMetrics(object):
+    """Thread-safe collector of the metrics of one run.
+
+    :param enabled: collect the metrics; a disabled collector ignores
+        everything, e.g. in a long running service where they would only
+        pile up
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget everything and restart the run clock."""
+        with self.lock:
+            self.started = time.time()
+            self.finished = None
+            self.stages = collections.defaultdict(list)  # stage: [(seconds, path)]
+            self.files = collections.defaultdict(
+                lambda: {"timings": {}, "status_codes": [], "retries": 0})
+            self.counters = collections.defaultdict(int)  # (name, path): count
+
+    def add(self, stage, seconds, pdf_path=None, path=None):
+        """Add the duration of one stage, of one file if `pdf_path` is given.
+
+        `path` is where a duration which is not of one file belongs, e.g.
+        the scanned directory, see `report`.
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            self.stages[stage].append((seconds, pdf_path or path))
+            if pdf_path:
+                timings = self.files[pdf_path]["timings"]
+                timings[stage] = timings.get(stage, 0) + seconds
+
+    @contextlib.contextmanager
+    def timer(self, stage, pdf_path=None, path=None):
+        """Measure the duration of the `with` block as `stage`."""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add(stage, time.time() - start, pdf_path, path)
+
+    def count(self, name, value=1, path=None):
+        """Increase the counter `name`, of the file or directory `path`."""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name, path] += value
+
+    def file(self, pdf_path, status_codes=(), retries=0, **values):
+        """Store information about one file, e.g. byte counts or its status."""
+        if not self.enabled:
+            return
+        with self.lock:
+            info = self.files[pdf_path]
+            info["status_codes"].extend(status_codes)
+            info["retries"] += retries
+            info.update(values)
+
+    def finish(self):
+        """Stop the run clock."""
+        self.finished = time.time()
+
+    def report(self, slowest=10, under=None):
+        """Return the aggregated metrics as a dictionary.
+
+        With `under`, only the files, durations and counters under that
+        directory are included; the run clock (`duration`) stays the one of
+        the whole run.
+        """
+        prefix = os.path.join(os.path.abspath(under), "") if under else None
+
+        def included(path):
+            return prefix is None or bool(
+                path and os.path.join(os.path.abspath(path), "").startswith(prefix))
+
+        with self.lock:
+            finished = self.finished or time.time()
+            duration = finished - self.started
+            files = dict((path, dict(info, total=sum(info["timings"].values())))
+                         for path, info in self.files.items() if included(path))
+            status_codes = {}
+            for info in files.values():
+                for code in info["status_codes"]:
+                    status_codes[str(code)] = status_codes.get(str(code), 0) + 1
+            counters = {}
+            for (name, path), count in self.counters.items():
+                if included(path):
+                    counters[name] = counters.get(name, 0) + count
+            stages = {}
+            for stage, samples in self.stages.items():
+                values = sorted(seconds for seconds, path in samples if included(path))
+                if not values:
+                    continue
+                stages[stage] = {
+                    "count": len(values),
+                    "total": sum(values),
+                    "mean": sum(values) / len(values),
+                    "p50": percentile(values, 50),
+                    "p95": percentile(values, 95),
+                    "max": values[-1],
+                    "histogram": histogram(values),
+                    }
+            return {
+                "directory": os.path.abspath(under) if under else None,
+                "started": self.started,
+                "finished": finished,
+                "duration": duration,
+                "files": len(files),
+                "files_per_second": len(files) / duration if duration else 0.0,
+                "retries": sum(info["retries"] for info in files.values()),
+                "status_codes": status_codes,
+                "counters": counters,
+                "stages": stages,
+                "slowest_files": sorted(
+                    files.items(), key=lambda item: -item[1]["total"])[:slowest],
+                "per_file": files,
+                }
+
+    def write_report(self, path, under=None):
+        """Write the JSON run report to `path`, see `report` for `under`."""
+        report = self.report(under=under)
+        with AtomicFile(path) as rfile:
+            rfile.write(json.dumps(report, indent=4, sort_keys=True))
+
+    def write_prometheus(self, path):
+        """Write the metrics in the Prometheus text format to `path`."""
+        report = self.report()
+        prefix = PROMETHEUS_PREFIX
+        lines = [
+            "# TYPE %s_run_duration_seconds gauge" % prefix,
+            "%s_run_duration_seconds %f" % (prefix, report["duration"]),
+            "# TYPE %s_last_run_timestamp_seconds gauge" % prefix,
+            "%s_last_run_timestamp_seconds %f" % (prefix, report["finished"]),
+            "# TYPE %s_files gauge" % prefix,
+            "%s_files %i" % (prefix, report["files"]),
+            "# TYPE %s_grobid_retries gauge" % prefix,
+            "%s_grobid_retries %i" % (prefix, report["retries"]),
+            "# TYPE %s_grobid_responses gauge" % prefix,
+            ]
+        for code, count in sorted(report["status_codes"].items()):
+            lines.append('%s_grobid_responses{code="%s"} %i' % (prefix, code, count))
+        lines.append("# TYPE %s_events gauge" % prefix)
+        for name, count in sorted(report["counters"].items()):
+            lines.append('%s_events{name="%s"} %i' % (prefix, name, count))
+        lines.append("# TYPE %s_stage_seconds histogram" % prefix)
+        for stage, values in sorted(report["stages"].items()):
+            for bound, count in values["histogram"]:
+                lines.append('%s_stage_seconds_bucket{stage="%s",le="%s"} %i'
+                             % (prefix, stage, bound, count))
+            lines.append('%s_stage_seconds_sum{stage="%s"} %f'
+                         % (prefix, stage, values["total"]))
+            lines.append('%s_stage_seconds_count{stage="%s"} %i'
+                         % (prefix, stage, values["count"]))
+        with AtomicFile(path) as pfile:
+            pfile.write("\n".join(lines) + "\n")
+
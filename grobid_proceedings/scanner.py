@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016 CERN.
+
+"""Lazy scanning of directory trees for pdfs.
+
+`iter_files` walks a tree with `scandir`, which tells files from directories
+without a stat call per entry, and yields the matching files as soon as they
+are found, so work can start before a big tree (e.g. on AFS) has been read.
+`scandir` is in `os` from Python 3.5; on Python 2 the backport is used if it
+is installed (pip install scandir), otherwise `os.listdir`.
+
+The (size, mtime) of every yielded file goes to a `StatCache`, so the later
+steps (ordering by size, the manifest, the metrics) do not stat the files
+again.
+"""
+
+from __future__ import absolute_import
+
+import fnmatch
+import os
+import threading
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+
+PDF_PATTERN = "Pages_from*.pdf"
+
+
+class StatCache(object):
+    """(size, mtime) of files, filled by `iter_files`."""
+
+    def __init__(self):
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def put(self, path, stat):
+        with self.lock:
+            self.stats[path] = (stat.st_size, stat.st_mtime)
+
+    def stat(self, path):
+        """Return (size, mtime) of a file, from the cache if it was scanned."""
+        with self.lock:
+            cached = self.stats.get(path)
+        if cached is None:
+            stat = os.stat(path)
+            cached = (stat.st_size, stat.st_mtime)
+        return cached
+
+    def size(self, path):
+        """Return the size of a file, from the cache if it was scanned."""
+        return self.stat(path)[0]
+
+    def forget(self, root):
+        """Drop the cached files under `root`."""
+        prefix = os.path.join(root, "")
+        with self.lock:
+            for path in [path for path in self.stats if path.startswith(prefix)]:
+                del self.stats[path]
+
+
+# Filled by every scan of the pipeline
+STATS = StatCache()
+
+
+def _list_dir(folder):
+    """Return (name, is directory, stat function) of the entries of `folder`."""
+    if scandir is not None:
+        return [(entry.name, entry.is_dir(follow_symlinks=False), entry.stat)
+                for entry in scandir(folder)]
+    entries = []
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        entries.append((name, os.path.isdir(path) and not os.path.islink(path),
+                        lambda path=path: os.stat(path)))
+    return entries
+
+
+def iter_files(root, pattern=PDF_PATTERN, stats=STATS):
+    """Yield the absolute paths of the files matching `pattern` under `root`.
+
+    The files are yielded in the order they are found, and their stats are
+    put into `stats`, replacing what was cached under `root` before.
+    Directories which cannot be read are skipped, like `os.walk` does.
+    """
+    root = os.path.abspath(root)
+    stats.forget(root)
+    folders = [root]
+    while folders:
+        folder = folders.pop(0)
+        try:
+            entries = _list_dir(folder)
+        except OSError:
+            continue
+        for name, is_dir, stat in entries:
+            path = os.path.join(folder, name)
+            if is_dir:
+                folders.append(path)
+            elif fnmatch.fnmatch(name, pattern):
+                try:
+                    stats.put(path, stat())
+                except OSError:
+                    continue  # Removed or a broken link
+                yield path
@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016 CERN.
+
+"""Local HTTP service converting pdfs to records.
+
+One long running process keeps the Grobid connections, the TEI cache and a
+pool of worker threads warm, so other tools get the records of
+`grobid_proceedings.py` without starting it for every call. The conversion
+itself is passed in as a function (see `grobid_proceedings.py --serve`).
+
+API:
+
+`POST /records?filename=<name>&pubdate=<year>&format=json|marcxml`
+    The body is one pdf. `filename` gives the cnum and first page like the
+    pdf file names do, e.g. `Pages_from_C12-03-10_11.pdf`. Answers the
+    record when it is done, JSON by default, or 502 if Grobid failed.
+`POST /jobs?pubdate=<year>`
+    The body is JSON `{"paths": [...]}` with pdfs or directories of pdfs on
+    this machine. Answers 202 with the job id at once.
+`GET /jobs/<id>?format=json|marcxml`
+    The state and progress of a job, with the records once it is done. With
+    `format=marcxml` the MARCXML collection of a finished job.
+`GET /health`
+    Answers `ok`.
+
+USAGE EXAMPLES:
+$ curl --data-binary @Pages_from_C12-03-10_11.pdf 'http://localhost:8060/records?filename=Pages_from_C12-03-10_11.pdf&pubdate=2012'
+$ curl -d '{"paths": ["/afs/cern.ch/.../C12-03-10"]}' 'http://localhost:8060/jobs?pubdate=2012'
+$ curl 'http://localhost:8060/jobs/<id>?format=marcxml'
+"""
+
+from __future__ import absolute_import
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from six import string_types
+from six.moves import BaseHTTPServer, queue, socketserver
+from six.moves.urllib.parse import parse_qs, urlsplit
+
+from grobid_proceedings.client import GrobidError
+from grobid_proceedings.utils import BackgroundServerMixin
+from grobid_proceedings.writer import COLLECTION_FOOTER, COLLECTION_HEADER
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8060
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+
+BLOCK_SIZE = 64 * 1024
+
+
+class ServiceError(Exception):
+    """A request which cannot be served, with its HTTP status code."""
+
+    def __init__(self, message, status_code=400):
+        super(ServiceError, self).__init__(message)
+        self.status_code = status_code
+
+
+class Job(object):
+    """Conversion of one or more pdfs.
+
+    :param items: (pdf path, file name) of every pdf; the file name gives
+        the cnum and first page, by default the name of the path
+    :param pubdate: publication date of the records
+    :param uploads: temporary files to remove when the job is done
+    """
+
+    def __init__(self, items, pubdate, uploads=()):
+        self.id = uuid.uuid4().hex
+        self.items = items
+        self.pubdate = pubdate
+        self.uploads = list(uploads)
+        self.status = QUEUED
+        self.created = time.time()
+        self.finished = None
+        self.records = {}  # pdf path: (mapping.Record, MARCXML)
+        self.errors = {}  # pdf path: error message
+        self.error_codes = {}  # pdf path: HTTP status code of the error
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+
+    def result(self, pdf_path, record=None, error=None, status_code=500):
+        """Store the record or error of one pdf, return True if it was the last."""
+        with self.lock:
+            if error is None:
+                self.records[pdf_path] = record
+            else:
+                self.errors[pdf_path] = error
+                self.error_codes[pdf_path] = status_code
+            self.status = RUNNING
+            if len(self.records) + len(self.errors) < len(self.items):
+                return False
+        self.finish()
+        return True
+
+    def finish(self):
+        """Mark the job done and remove its uploads."""
+        self.status = DONE
+        self.finished = time.time()
+        for path in self.uploads:
+            if os.path.exists(path):
+                os.remove(path)
+        self.done.set()
+
+    def ordered(self):
+        """Return the records in the order of the items."""
+        return [self.records[pdf_path] for pdf_path, _ in self.items
+                if pdf_path in self.records]
+
+    def to_json(self, records=True):
+        """Return the state of the job, with the record dictionaries if done."""
+        state = {
+            "id": self.id,
+            "status": self.status,
+            "total": len(self.items),
+            "processed": len(self.records) + len(self.errors),
+            "errors": self.errors,
+            }
+        if self.finished:
+            state["seconds"] = self.finished - self.created
+        if records and self.status == DONE:
+            state["records"] = [record.to_dict() for record, _ in self.ordered()]
+        return state
+
+    def marcxml(self):
+        """Return the MARCXML collection of a finished job."""
+        return (COLLECTION_HEADER + "".join(marcxml for _, marcxml in self.ordered())
+                + COLLECTION_FOOTER)
+
+
+class JobPool(object):
+    """Worker threads shared by all the jobs.
+
+    The pdfs of the jobs are processed in the order they were submitted.
+
+    :param convert: function of (pdf path, pubdate, file name) returning the
+        `mapping.Record` and its MARCXML; it raises `ServiceError` for a pdf
+        the client got wrong
+    :param workers: number of pdfs converted at the same time
+    :param keep_jobs: number of finished jobs kept for polling
+    """
+
+    def __init__(self, convert, workers=4, keep_jobs=100):
+        self.convert = convert
+        self.keep_jobs = keep_jobs
+        self.jobs = {}  # id: Job
+        self.lock = threading.Lock()
+        self.tasks = queue.Queue()
+        for _ in range(workers):
+            thread = threading.Thread(target=self.work)
+            thread.daemon = True
+            thread.start()
+
+    def submit(self, items, pubdate, uploads=()):
+        """Queue the conversion of `items` and return the new `Job`."""
+        job = Job(items, pubdate, uploads)
+        with self.lock:
+            self.jobs[job.id] = job
+            finished = sorted((old for old in self.jobs.values() if old.status == DONE),
+                              key=lambda old: old.created)
+            for old in finished[:max(0, len(finished) - self.keep_jobs)]:
+                del self.jobs[old.id]
+        if not items:
+            job.finish()
+        for pdf_path, filename in items:
+            self.tasks.put((job, pdf_path, filename))
+        logger.info("Job %s: %i pdfs" % (job.id, len(items)))
+        return job
+
+    def get(self, job_id):
+        """Return the job `job_id`, or None if it is not known (any more)."""
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def work(self):
+        while True:
+            job, pdf_path, filename = self.tasks.get()
+            record = error = None
+            status_code = 500
+            try:
+                record = self.convert(pdf_path, job.pubdate, filename)
+            except ServiceError as err:
+                error, status_code = str(err), err.status_code
+            except GrobidError as err:
+                error, status_code = str(err), 502
+            except Exception as err:
+                logger.exception("Could not convert " + pdf_path)
+                error = "%s: %s" % (err.__class__.__name__, err)
+            if job.result(pdf_path, record, error, status_code):
+                logger.info("Job %s done in %.1f s"
+                            % (job.id, job.finished - job.created))
+
+
+class ServiceHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Answer the requests of the API, see the module documentation."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.dispatch(self.get)
+
+    def do_POST(self):
+        self.dispatch(self.post)
+
+    def dispatch(self, method):
+        self.unread = int(self.headers.get("Content-Length") or 0)
+        url = urlsplit(self.path)
+        query = dict((key, values[-1]) for key, values in parse_qs(url.query).items())
+        try:
+            method(url.path.rstrip("/"), query)
+        except ServiceError as err:
+            self.discard()
+            self.respond(err.status_code, {"error": str(err)})
+        except Exception as err:
+            logger.exception("Error in " + self.path)
+            self.discard()
+            self.respond(500, {"error": "%s: %s" % (err.__class__.__name__, err)})
+
+    def get(self, path, query):
+        if path == "/health":
+            self.respond(200, "ok", "text/plain")
+        elif path.startswith("/jobs/"):
+            job = self.server.pool.get(path[len("/jobs/"):])
+            if job is None:
+                raise ServiceError("No such job", 404)
+            if query.get("format") == "marcxml":
+                if job.status != DONE:
+                    raise ServiceError("Job is " + job.status, 409)
+                self.respond(200, job.marcxml(), "application/marcxml+xml")
+            else:
+                self.respond(200, job.to_json())
+        else:
+            raise ServiceError("Not found", 404)
+
+    def post(self, path, query):
+        pubdate = query.get("pubdate", "")
+        if path == "/records":
+            filename = os.path.basename(query.get("filename", "input.pdf"))
+            upload = self.receive()
+            job = self.server.pool.submit([(upload, filename)], pubdate, [upload])
+            job.done.wait()
+            if job.errors:
+                raise ServiceError(job.errors[upload], job.error_codes[upload])
+            record, marcxml = job.records[upload]
+            if query.get("format") == "marcxml":
+                self.respond(200, marcxml, "application/marcxml+xml")
+            else:
+                self.respond(200, record.to_dict())
+        elif path == "/jobs":
+            try:
+                paths = json.loads(self.read_body().decode("utf-8"))["paths"]
+            except (ValueError, KeyError, TypeError):
+                raise ServiceError('The body should be JSON {"paths": [...]}')
+            if (not isinstance(paths, list)
+                    or not all(isinstance(pdf_path, string_types) for pdf_path in paths)):
+                raise ServiceError('"paths" should be a list of paths')
+            items = []
+            for pdf_path in paths:
+                if os.path.isdir(pdf_path):
+                    items.extend((found, None) for found in self.server.find_pdfs(pdf_path))
+                elif os.path.isfile(pdf_path):
+                    items.append((os.path.abspath(pdf_path), None))
+                else:
+                    raise ServiceError("No such file or directory: " + pdf_path, 404)
+            job = self.server.pool.submit(items, pubdate)
+            self.respond(202, job.to_json(records=False),
+                         headers={"Location": "/jobs/" + job.id})
+        else:
+            raise ServiceError("Not found", 404)
+
+    def blocks(self):
+        """Yield the body in blocks, refusing bodies over `max_upload`."""
+        if self.unread > self.server.max_upload:
+            raise ServiceError("The body is over %i bytes" % self.server.max_upload, 413)
+        while self.unread > 0:
+            block = self.rfile.read(min(self.unread, BLOCK_SIZE))
+            if not block:
+                self.unread = 0
+                break
+            self.unread -= len(block)
+            yield block
+
+    def read_body(self):
+        return b"".join(self.blocks())
+
+    def receive(self):
+        """Stream the body to a temporary pdf and return its path."""
+        if not self.unread:
+            raise ServiceError("The body should be a pdf")
+        fd, path = tempfile.mkstemp(dir=self.server.upload_dir, suffix=".pdf")
+        try:
+            with os.fdopen(fd, "wb") as pfile:
+                for block in self.blocks():
+                    pfile.write(block)
+        except BaseException:
+            os.remove(path)
+            raise
+        return path
+
+    def discard(self):
+        """Skip an unread body, so that the connection can be reused."""
+        if self.unread > self.server.max_upload:
+            self.close_connection = True
+            return
+        for _ in self.blocks():
+            pass
+
+    def respond(self, status_code, body, content_type="application/json",
+                headers=None):
+        if content_type == "application/json":
+            body = json.dumps(body, sort_keys=True)
+        if not isinstance(body, bytes):
+            body = body.encode("utf-8")
+        self.send_response(status_code)
+        self.send_header("Content-Type", content_type + "; charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s" % (self.address_string(), format % args))
+
+
+class RecordService(BackgroundServerMixin, socketserver.ThreadingMixIn,
+                    BaseHTTPServer.HTTPServer):
+    """Threaded HTTP server of the API.
+
+    :param convert: see `JobPool`
+    :param find_pdfs: function returning the pdf paths of a directory
+    :param port: port to listen on, 0 picks a free one
+    :param workers: number of pdfs converted at the same time
+    :param upload_dir: directory for the uploaded pdfs, by default the
+        system temporary directory
+    :param max_upload: largest accepted body in bytes
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, convert, find_pdfs, port=DEFAULT_PORT, workers=4,
+                 host="127.0.0.1", upload_dir=None, max_upload=200 * 1024 ** 2):
+        BaseHTTPServer.HTTPServer.__init__(self, (host, port), ServiceHandler)
+        self.pool = JobPool(convert, workers)
+        self.find_pdfs = find_pdfs
+        self.upload_dir = upload_dir
+        self.max_upload = max_upload
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016 CERN.
+
+"""Split a proceedings pdf into one pdf per contribution.
+
+This replaces the pdftk loop of `split_proceedings.sh`: the proceedings are
+parsed once (once per process with -j) and every page range of the page
+range file is written to `Pages_from_<CNUM>_<fpage>.pdf` next to the
+proceedings, or to the output directory. The page range file has one range
+per line, e.g. `17-34`, and may have DOS line endings and a byte order mark.
+
+Splitting needs PyPDF2. Without it, pdftk is run once per range like the
+shell script did.
+
+`first_pages` cuts the first pages of a contribution for the header.
+
+USAGE EXAMPLES:
+$ python -m grobid_proceedings.splitter C16-02-01.1_Proceedings.pdf pageranges.txt
+$ python -m grobid_proceedings.splitter -j 4 -o C16-02-01.1/ C16-02-01.1_Proceedings.pdf pageranges.txt
+"""
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+import getopt
+import io
+import logging
+import multiprocessing
+import os
+import re
+import subprocess
+import sys
+
+try:
+    import PyPDF2
+except ImportError:
+    PyPDF2 = None
+
+from grobid_proceedings.utils import AtomicFile
+
+
+logger = logging.getLogger(__name__)
+
+# The CNUM in the proceedings file name, e.g. C16-02-01.pdf,
+# C16-02-01.1.pdf or C16-02-01.1_Proceedings.pdf
+CNUM_PATTERN = re.compile(r'(C\d{2}-\d{2}-\d{2}(?:\.\d+)?).*\.pdf$', re.IGNORECASE)
+
+# One pdftk style page range, e.g. `17-34`, `5` or `580-end`
+RANGE_PATTERN = re.compile(r'^\s*(\d+)\s*(?:-\s*(\d+|end)\s*)?$')
+
+OUTPUT_TEMPLATE = "Pages_from_%s_%i.pdf"
+
+
+def get_cnum(proceedings):
+    """Return the CNUM in the file name of the proceedings, or ''."""
+    match = CNUM_PATTERN.search(os.path.basename(proceedings))
+    return match.group(1) if match else ''
+
+
+def read_ranges(page_file):
+    """Read a page range file and return a list of (first, last) pages.
+
+    Pages are numbered from 1 and `last` is None for `end`. Blank lines are
+    skipped, as are lines that are not page ranges, with a warning.
+    """
+    ranges = []
+    # utf-8-sig drops the BOM of files saved by Windows editors, which would
+    # make the first line no page range
+    with io.open(page_file, "r", encoding="utf-8-sig", newline=None) as pfile:
+        for number, line in enumerate(pfile, 1):
+            line = line.strip()
+            if not line:
+                continue
+            match = RANGE_PATTERN.match(line)
+            if not match:
+                logger.warning("%s:%i: not a page range: %r" % (page_file, number, line))
+                continue
+            first, last = match.groups()
+            if last is None:
+                last = first
+            ranges.append((int(first), None if last == "end" else int(last)))
+    return ranges
+
+
+def output_path(output_dir, cnum, first):
+    """Return the path of the slice starting at page `first`."""
+    return os.path.join(output_dir, OUTPUT_TEMPLATE % (cnum, first))
+
+
+def open_reader(proceedings):
+    """Parse the proceedings with PyPDF2."""
+    if PyPDF2 is None:
+        raise ImportError("Splitting without pdftk needs PyPDF2: pip install PyPDF2")
+    # The file has to stay open as long as the pages are used
+    return PyPDF2.PdfFileReader(open(proceedings, "rb"), strict=False)
+
+
+def write_slice(reader, first, last, out):
+    """Write pages `first`..`last` of `reader` to the binary file `out`."""
+    last = min(last or reader.getNumPages(), reader.getNumPages())
+    if first > last:
+        raise ValueError("Page range %i-%i is outside of the %i pages"
+                         % (first, last, reader.getNumPages()))
+    writer = PyPDF2.PdfFileWriter()
+    for page in range(first - 1, last):
+        writer.addPage(reader.getPage(page))
+    writer.write(out)
+
+
+def first_pages(pdf_file, pages):
+    """Return the first `pages` pages of a pdf as bytes.
+
+    Return None if the pdf has no more pages than that, if PyPDF2 is not
+    installed or if the pdf cannot be read.
+    """
+    if PyPDF2 is None:
+        return None
+    out = io.BytesIO()
+    with open(pdf_file, "rb") as pfile:
+        try:
+            reader = PyPDF2.PdfFileReader(pfile, strict=False)
+            if reader.getNumPages() <= pages:
+                return None
+            write_slice(reader, 1, pages, out)
+        except Exception as err:
+            logger.debug("Cannot take the first pages of %s: %s" % (pdf_file, err))
+            return None
+    return out.getvalue()
+
+
+def save_slice(reader, first, last, path):
+    """Write a slice to `path` through a temporary file."""
+    with AtomicFile(path, "wb") as out:
+        write_slice(reader, first, last, out)
+
+
+_reader = None
+
+
+def _init_process(proceedings):
+    """Parse the proceedings once in every worker process."""
+    global _reader
+    _reader = open_reader(proceedings)
+
+
+def _save_slice(job):
+    first, last, path = job
+    save_slice(_reader, first, last, path)
+    return path
+
+
+def pdftk_slice(proceedings, first, last, path):
+    """Write a slice with pdftk, as `split_proceedings.sh` does."""
+    page_range = "%i-%s" % (first, "end" if last is None else last)
+    subprocess.check_call(["pdftk", proceedings, "cat", page_range, "output", path])
+
+
+def split_proceedings(proceedings, page_file, output_dir=None, processes=1):
+    """Split `proceedings` by the ranges of `page_file`.
+
+    Return the paths of the written slices. They go to the directory of the
+    proceedings unless `output_dir` is given.
+    """
+    output_dir = output_dir or os.path.dirname(os.path.abspath(proceedings))
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    cnum = get_cnum(proceedings)
+    if not cnum:
+        logger.warning("No CNUM in the file name " + proceedings)
+    jobs = [(first, last, output_path(output_dir, cnum, first))
+            for first, last in read_ranges(page_file)]
+    logger.info("Splitting %s into %i files" % (proceedings, len(jobs)))
+
+    if PyPDF2 is None:
+        logger.warning("PyPDF2 is not installed, splitting with pdftk")
+        for first, last, path in jobs:
+            pdftk_slice(proceedings, first, last, path)
+    elif processes > 1 and len(jobs) > 1:
+        pool = multiprocessing.Pool(
+            min(processes, len(jobs)), _init_process, (proceedings, ))
+        try:
+            for path in pool.imap_unordered(_save_slice, jobs):
+                logger.debug("Wrote " + path)
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+    else:
+        reader = open_reader(proceedings)
+        try:
+            for first, last, path in jobs:
+                save_slice(reader, first, last, path)
+                logger.debug("Wrote " + path)
+        finally:
+            reader.stream.close()
+    return [path for _, _, path in jobs]
+
+
+def main(argv):
+    """Main function."""
+    helptext = ("Usage: python -m grobid_proceedings.splitter [-o <output dir>] "
+                "[-j <processes>] <proceedings pdf> <page range file>")
+    output_dir = None
+    processes = 1
+    try:
+        opts, args = getopt.getopt(argv, "ho:j:")
+    except getopt.GetoptError:
+        print(helptext)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == "-h":
+            print(helptext)
+            sys.exit()
+        elif opt == "-o":
+            output_dir = arg
+        elif opt == "-j":
+            processes = int(arg)
+    if len(args) != 2 or not all(os.path.isfile(arg) for arg in args):
+        print(helptext)
+        sys.exit(2)
+
+    logging.basicConfig(level=logging.INFO)
+    for path in split_proceedings(args[0], args[1], output_dir, processes):
+        print(path)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016 CERN.
+
+"""Intermediate store of the extracted records.
+
+The records built from the Grobid output (`build_dict`) are appended as
+dictionaries (`mapping.Record.to_dict`) to one gzipped JSON lines file per
+cnum, `marc_records/<cnum>.records.jsonl.gz`. The MARCXML can be exported again
+from these files, e.g. with another pubdate or a changed mapping, without
+Grobid or TEI parsing. They can be inspected with `zcat` and `jq`.
+
+Like in the manifest, a pdf can have several lines and the last one wins.
+"""
+
+from __future__ import absolute_import
+
+import contextlib
+import glob
+import gzip
+import json
+import logging
+import operator
+import os
+import zlib
+
+from grobid_proceedings.utils import AtomicFile
+
+
+logger = logging.getLogger(__name__)
+
+SUFFIX = ".records.jsonl.gz"
+
+
+def store_path(output_dir, cnum):
+    """Return the path of the record store of `cnum`."""
+    return os.path.join(output_dir, cnum + SUFFIX)
+
+
+def find_stores(output_dir):
+    """Return {cnum: path} of the record stores in `output_dir`."""
+    return dict((os.path.basename(path)[:-len(SUFFIX)], path)
+                for path in glob.glob(os.path.join(output_dir, "*" + SUFFIX)))
+
+
+class RecordStore(object):
+    """Gzipped JSON lines file of the record dictionaries of one cnum.
+
+    :param path: path of the file, see `store_path`
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rfile = None
+
+    def append(self, record):
+        """Add a record dictionary and flush it to the file."""
+        if self.rfile is None:
+            folder = os.path.dirname(self.path)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder)
+            self.rfile = gzip.open(self.path, "ab")
+        self.rfile.write(json.dumps(record, sort_keys=True).encode("utf-8") + b"\n")
+        self.rfile.flush()
+
+    def close(self):
+        """Close the file."""
+        if self.rfile is not None:
+            self.rfile.close()
+            self.rfile = None
+
+    def read(self):
+        """Yield every stored line as a dictionary.
+
+        The end of a file cut by an interrupted run is skipped.
+        """
+        if not os.path.exists(self.path):
+            return
+        with contextlib.closing(gzip.open(self.path, "rb")) as rfile:
+            try:
+                for line in rfile:
+                    try:
+                        yield json.loads(line.decode("utf-8"))
+                    except ValueError:
+                        continue  # Last line of an interrupted run
+            except (EOFError, IOError, zlib.error) as err:
+                logger.warning("%s is cut short: %s" % (self.path, err))
+
+    def records(self):
+        """Return the latest record of every pdf, in the order of the file."""
+        latest = {}  # pdf path: (line number, record)
+        for number, record in enumerate(self.read()):
+            latest[record["pdf_path"]] = (number, record)
+        return [record for _, record in sorted(latest.values(),
+                                               key=operator.itemgetter(0))]
+
+    def compact(self, pdf_paths=None):
+        """Rewrite the file with the latest record of every pdf.
+
+        With `pdf_paths`, the records of other pdfs are dropped.
+        """
+        self.close()
+        keep = None if pdf_paths is None else set(pdf_paths)
+        records = [record for record in self.records()
+                   if keep is None or record["pdf_path"] in keep]
+        with AtomicFile(self.path, "wb") as afile:
+            gzfile = gzip.GzipFile(filename="", mode="wb", fileobj=afile.file)
+            with contextlib.closing(gzfile) as rfile:
+                for record in records:
+                    rfile.write(json.dumps(record, sort_keys=True).encode("utf-8") + b"\n")
+
+    def clear(self):
+        """Remove all the records."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016 CERN.
+
+"""Local stand-in for a Grobid server, for testing and benchmarks.
+
+It answers the Grobid services used by the pipeline with canned TEI, after a
+configurable delay. A part of the requests can fail with 500 or 503, and like
+Grobid, it answers 503 when more than `max_concurrency` requests are being
+processed at the same time.
+
+USAGE EXAMPLES:
+$ python -m grobid_proceedings.stubserver -p 8070
+$ python -m grobid_proceedings.stubserver -p 8070 -l 0.5 -e 0.05 -c 4 -f fixtures/
+"""
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+import getopt
+import glob
+import io
+import os
+import random
+import sys
+import threading
+import time
+
+from six.moves import BaseHTTPServer, socketserver
+
+from grobid_proceedings.utils import BackgroundServerMixin
+
+
+SERVICES = ("/processFulltextDocument", "/processHeaderDocument")
+
+DEFAULT_TEI = u"""<?xml version="1.0" encoding="UTF-8"?>
+<TEI xmlns="http://www.tei-c.org/ns/1.0">
+    <teiHeader xml:lang="en">
+        <fileDesc>
+            <titleStmt>
+                <title level="a" type="main">Search for new physics at the LHC</title>
+            </titleStmt>
+            <sourceDesc>
+                <biblStruct>
+                    <analytic>
+                        <author>
+                            <persName><forename type="first">Jean</forename><forename type="middle">P</forename><surname>Dupont</surname></persName>
+                            <affiliation><orgName type="institution">CERN</orgName></affiliation>
+                        </author>
+                        <author>
+                            <persName><forename type="first">A</forename><surname>Müller</surname></persName>
+                            <affiliation><orgName type="institution">(DESY)</orgName></affiliation>
+                        </author>
+                    </analytic>
+                </biblStruct>
+            </sourceDesc>
+        </fileDesc>
+        <profileDesc>
+            <abstract><p>We present recent results &amp; prospects.</p></abstract>
+        </profileDesc>
+    </teiHeader>
+    <text/>
+</TEI>
+"""
+
+
+class StubGrobidHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Answer Grobid requests according to the settings of the server."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.path == "/api/isalive":
+            self.respond(200, "true", "text/plain")
+        elif self.path == "/api/version":
+            self.respond(200, "stub", "text/plain")
+        else:
+            self.respond(404, "Not found", "text/plain")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        while length > 0:  # Discard the upload without keeping it in memory
+            length -= len(self.rfile.read(min(length, 65536)) or b"x" * length)
+        if self.path not in SERVICES:
+            self.respond(404, "Not found", "text/plain")
+            return
+        server = self.server
+        with server.lock:
+            busy = server.in_flight >= server.max_concurrency
+            if not busy:
+                server.in_flight += 1
+            server.requests += 1
+        if busy:
+            self.respond(503, "Too many requests", "text/plain")
+            return
+        try:
+            time.sleep(server.latency * random.uniform(0.5, 1.5))
+            if random.random() < server.error_rate:
+                self.respond(random.choice((500, 503)), "Stub error", "text/plain")
+            else:
+                self.respond(200, random.choice(server.fixtures), "application/xml")
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def respond(self, status_code, body, content_type):
+        body = body.encode("utf-8")
+        self.send_response(status_code)
+        self.send_header("Content-Type", content_type + "; charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class StubGrobidServer(BackgroundServerMixin, socketserver.ThreadingMixIn,
+                       BaseHTTPServer.HTTPServer):
+    """Threaded HTTP server imitating Grobid.
+
+    :param port: port to listen on, 0 picks a free one
+    :param latency: mean processing time of one request in seconds
+    :param error_rate: share of the requests answered with 500 or 503
+    :param max_concurrency: requests processed at the same time before
+        answering 503
+    :param fixture_dir: directory of `*.xml` TEI files to answer with
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0, latency=0.1, error_rate=0.0, max_concurrency=10,
+                 fixture_dir=None, host="127.0.0.1", verbose=False):
+        BaseHTTPServer.HTTPServer.__init__(self, (host, port), StubGrobidHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.max_concurrency = max_concurrency
+        self.verbose = verbose
+        self.fixtures = load_fixtures(fixture_dir) if fixture_dir else [DEFAULT_TEI]
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.requests = 0
+
+
+def load_fixtures(fixture_dir):
+    """Read the TEI fixtures of a directory."""
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(fixture_dir, "*.xml"))):
+        with io.open(path, "r", encoding="utf-8") as tfile:
+            fixtures.append(tfile.read())
+    if not fixtures:
+        raise ValueError("No TEI fixtures (*.xml) in " + fixture_dir)
+    return fixtures
+
+
+def main(argv):
+    """Main function."""
+    helptext = ("Usage: python -m grobid_proceedings.stubserver [-p <port>] "
+                "[-l <latency>] [-e <error rate>] [-c <max concurrency>] "
+                "[-f <fixture dir>]")
+    settings = {"port": 8070, "verbose": True}
+    try:
+        opts, args = getopt.getopt(argv, "hp:l:e:c:f:")
+    except getopt.GetoptError:
+        print(helptext)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == "-h":
+            print(helptext)
+            sys.exit()
+        elif opt == "-p":
+            settings["port"] = int(arg)
+        elif opt == "-l":
+            settings["latency"] = float(arg)
+        elif opt == "-e":
+            settings["error_rate"] = float(arg)
+        elif opt == "-c":
+            settings["max_concurrency"] = int(arg)
+        elif opt == "-f":
+            settings["fixture_dir"] = arg
+
+    server = StubGrobidServer(**settings)
+    print("Stub Grobid listening on " + server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016 CERN.
+
+"""Watch directory trees for new, modified and removed pdfs.
+
+`InotifyWatcher` is told about changes by the kernel through pyinotify.
+inotify does not see the changes made by other AFS clients, so trees on AFS,
+or any tree when pyinotify is not installed, are scanned every few seconds
+by `PollingWatcher` instead. `make_watcher` picks one of them.
+
+Both have a `changes(timeout)` method which waits at most `timeout` seconds
+and returns the paths of the pdfs that changed since the last call.
+"""
+
+from __future__ import absolute_import
+
+import fnmatch
+import logging
+import os
+import time
+
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
+
+from grobid_proceedings import scanner
+
+
+logger = logging.getLogger(__name__)
+
+PDF_PATTERN = scanner.PDF_PATTERN
+
+# Network file systems on which inotify misses changes of other clients
+POLL_PREFIXES = ("/afs/", )
+
+
+def scan(roots, pattern=PDF_PATTERN):
+    """Return {path: (size, mtime)} of the matching files under `roots`."""
+    stats = scanner.StatCache()
+    for root in roots:
+        for _ in scanner.iter_files(root, pattern, stats):
+            pass
+    return stats.stats
+
+
+class PollingWatcher(object):
+    """Find changed pdfs by scanning the trees every `interval` seconds.
+
+    A file which is still being copied shows up in every scan until it is
+    complete, so the caller should wait for a file to stay unchanged for
+    longer than `interval`.
+
+    :param roots: directories to watch, with their subdirectories
+    :param interval: seconds between scans
+    """
+
+    def __init__(self, roots, interval=30, pattern=PDF_PATTERN):
+        self.roots = roots
+        self.interval = interval
+        self.pattern = pattern
+        self.snapshot = scan(roots, pattern)
+        self.scanned = time.time()
+
+    def changes(self, timeout):
+        """Return the paths added, modified or removed since the last scan."""
+        delay = self.scanned + self.interval - time.time()
+        if delay > timeout:
+            time.sleep(timeout)
+            return set()
+        if delay > 0:
+            time.sleep(delay)
+        snapshot = scan(self.roots, self.pattern)
+        self.scanned = time.time()
+        changed = set(path for path, stat in snapshot.items()
+                      if self.snapshot.get(path) != stat)
+        changed.update(path for path in self.snapshot if path not in snapshot)
+        self.snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(object):
+    """Find changed pdfs with inotify.
+
+    Files are reported when they are closed after writing, moved in, moved
+    out or deleted, and new subdirectories are watched as they appear.
+
+    :param roots: directories to watch, with their subdirectories
+    """
+
+    interval = 0
+    MASK = ((pyinotify.IN_CLOSE_WRITE | pyinotify.IN_MOVED_TO |
+             pyinotify.IN_MOVED_FROM | pyinotify.IN_DELETE |
+             pyinotify.IN_CREATE) if pyinotify else 0)
+
+    def __init__(self, roots, pattern=PDF_PATTERN):
+        if pyinotify is None:
+            raise ImportError("Watching with inotify needs pyinotify: pip install pyinotify")
+        self.pattern = pattern
+        self.changed = set()
+        self.manager = pyinotify.WatchManager()
+        self.notifier = pyinotify.Notifier(self.manager, self.process)
+        for root in roots:
+            self.manager.add_watch(root, self.MASK, rec=True, auto_add=True)
+
+    def process(self, event):
+        """Note the path of an inotify event."""
+        if event.dir:
+            if event.mask & (pyinotify.IN_CREATE | pyinotify.IN_MOVED_TO):
+                # Files moved in with their directory have no events
+                self.changed.update(scan([event.pathname], self.pattern))
+        elif fnmatch.fnmatch(event.name, self.pattern):
+            if not event.mask & pyinotify.IN_CREATE:  # Wait for IN_CLOSE_WRITE
+                self.changed.add(event.pathname)
+
+    def changes(self, timeout):
+        """Return the paths changed since the last call."""
+        if self.notifier.check_events(int(timeout * 1000)):
+            self.notifier.read_events()
+            self.notifier.process_events()
+        changed, self.changed = self.changed, set()
+        return changed
+
+    def close(self):
+        self.notifier.stop()
+
+
+def make_watcher(roots, interval=30, poll=False):
+    """Return an `InotifyWatcher`, or a `PollingWatcher` where inotify fails.
+
+    Polling is used with `poll`, without pyinotify, and for trees on AFS.
+    """
+    if not poll and pyinotify is None:
+        logger.warning("pyinotify is not installed, polling every %i s" % interval)
+        poll = True
+    if not poll and any(os.path.abspath(root).startswith(POLL_PREFIXES)
+                        for root in roots):
+        logger.info("Polling AFS every %i s" % interval)
+        poll = True
+    if poll:
+        return PollingWatcher(roots, interval)
+    return InotifyWatcher(roots)
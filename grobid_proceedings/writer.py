@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016 CERN.
+
+"""Streaming writer for MARCXML collection files.
+
+`CollectionWriter` opens the target once and writes the records inside a
+`<collection>` element in a given order, as soon as all the records before
+them are ready. Everything goes to a temporary file in the same directory,
+which is renamed over the target when the writer is closed, so a crashed run
+never leaves a half written collection behind.
+"""
+
+from __future__ import absolute_import
+
+import threading
+
+from grobid_proceedings.utils import AtomicFile
+
+
+COLLECTION_HEADER = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                     '<collection xmlns="http://www.loc.gov/MARC21/slim">\n')
+COLLECTION_FOOTER = '</collection>\n'
+
+
+class CollectionWriter(object):
+    """Write records to one collection file in a fixed order.
+
+    :param path: path of the collection file
+    :param order: keys of the records in the order they should be written
+    :param max_pending: how many records may be submitted but not yet written,
+        see `reserve`
+    """
+
+    def __init__(self, path, order, max_pending=100):
+        self.path = path
+        self.order = list(order)
+        self.position = 0
+        self.pending = {}
+        self.written = 0
+        self.slots = threading.Semaphore(max_pending)
+        self.reserved = set()
+        self.lock = threading.Lock()
+        self.xfile = AtomicFile(path)
+        self.xfile.write(COLLECTION_HEADER)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def reserve(self, key):
+        """Block until there is room for one more record in the reorder buffer.
+
+        Call this before submitting the work that produces the record `key`,
+        in the same order as `order`, to keep the buffer bounded.
+        """
+        self.slots.acquire()
+        with self.lock:
+            self.reserved.add(key)
+
+    def add(self, key, record):
+        """Add a record and write every record that is now in order."""
+        self.pending[key] = record
+        while (self.position < len(self.order)
+               and self.order[self.position] in self.pending):
+            self.write(self.order[self.position])
+            self.position += 1
+
+    def write(self, key):
+        """Write the pending record `key` to the file."""
+        self.xfile.write(self.pending.pop(key))
+        self.written += 1
+        with self.lock:
+            if key in self.reserved:
+                self.reserved.discard(key)
+                self.slots.release()
+
+    def close(self):
+        """Write the leftover records and move the file to its place."""
+        for key in self.order[self.position:]:
+            if key in self.pending:
+                self.write(key)
+        self.position = len(self.order)
+        for key in sorted(self.pending):
+            self.write(key)  # Records which were not in `order`
+        self.xfile.write(COLLECTION_FOOTER)
+        self.xfile.commit()
+
+    def abort(self):
+        """Remove the temporary file without touching the target."""
+        self.xfile.discard()
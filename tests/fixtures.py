@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016 CERN.
+
+"""Test data shared by the tests and `grobid_proceedings.benchmark`."""
+
+from __future__ import absolute_import
+
+from grobid_proceedings import filenames
+
+
+# Author names as Grobid returns them, with the odd cases seen in proceedings
+GOLDEN_NAMES = [
+    "", " ", "'", "1", "12@", "John Smith", "Smith, John", "J. Smith", "J Smith",
+    "Smith, J.", "Smith, J", "Smith, J. P.", "Smith, J.P.", "J.-P. Dupont",
+    "Jean Pierre Dupont", "Jean-Pierre Dupont", "Dupont, Jean Pierre",
+    "Dupont, Jean, Pierre", "Dupont,", ",Jean", " 'John Smith' ", "John  Smith",
+    "John\tSmith", "van der Berg, K.", "K. van der Berg", "O'Neil, P.", "P. O'Neil",
+    "Smith1", "J. Smith1,2", "J. Smith@", "J. Smith bullet", "bullet1 J. Smith",
+    "ATLAS Collaboration", "the CMS collaboration", "LHCb Collaboration1",
+    "A. B. C. D. Smith", "A . Smith", "A.. Smith", ". Smith", "Smith .",
+    "Alpha Beta Gamma Delta", "X", "X.", "X Y", "Smith, ",
+    u"Müller, J.", u"J. Müller", u"Ñúñez, María", u"María Ñúñez", u"Łukasz Ż",
+    u"J. Smith\u00b9", u"J. Smith\u00b2\u00b3", u"Smith\u2070, J.",
+    u"J.\u00a0Smith", u"\u5f20 \u4f1f", u"Smith\u0661, A.", u"Gonçalves, João",
+    ]
+
+
+# File names found in the upload directories, with their classification
+FILENAME_FIXTURES = [
+    ("Pages_from_C12-03-10_11.pdf", ("C12-03-10", "11", None, filenames.CONTRIBUTION)),
+    ("Pages_from_C75-03-02_101.pdf", ("C75-03-02", "101", None, filenames.CONTRIBUTION)),
+    ("Pages_from_C88-01-23_15-24.pdf", ("C88-01-23", "15", "24", filenames.CONTRIBUTION)),
+    ("Pages_from_C88-03-06.1_79-89.pdf", ("C88-03-06.1", "79", "89", filenames.CONTRIBUTION)),
+    ("Pages_from_C16-02-01.1_5.pdf", ("C16-02-01.1", "5", None, filenames.CONTRIBUTION)),
+    ("Pages_from_C16-02-01.12_5.pdf", ("C16-02-01.12", "5", None, filenames.CONTRIBUTION)),
+    ("Pages_from_C12-03-10-11.pdf", ("C12-03-10", "11", None, filenames.CONTRIBUTION)),
+    ("Pages_from_C12-03-10_1.pdfa", ("C12-03-10", "1", None, filenames.CONTRIBUTION)),
+    ("Pages_from_C12-03-10_007.pdf", ("C12-03-10", "007", None, filenames.CONTRIBUTION)),
+    ("C73-03-04_Proceedings.pdf", ("C73-03-04", None, None, filenames.PROCEEDINGS)),
+    ("C73-03-04-Proceedings.pdf", ("C73-03-04", None, None, filenames.PROCEEDINGS)),
+    ("C16-02-01.1_Proceedings.pdf", ("C16-02-01.1", None, None, filenames.PROCEEDINGS)),
+    ("C73-03-04.pdf", ("C73-03-04", None, None, filenames.PROCEEDINGS)),
+    ("Pages_from_C12-03-10.pdf", (None, None, None, filenames.UNKNOWN)),
+    ("Pages_from_C12-03-10_11.PDF", (None, None, None, filenames.UNKNOWN)),
+    ("Pages from C12-03-10_11.pdf", (None, None, None, filenames.UNKNOWN)),
+    ("Pages_from_C12-03-10_11 (1).pdf", (None, None, None, filenames.UNKNOWN)),
+    ("Pages_from_C12-3-10_11.pdf", (None, None, None, filenames.UNKNOWN)),
+    ("Pages_from_Proceedings_11.pdf", (None, None, None, filenames.UNKNOWN)),
+    ("Pages_from_C12-03-10_11.pdf.txt", (None, None, None, filenames.UNKNOWN)),
+    ("C12-03-10_Program.pdf", (None, None, None, filenames.UNKNOWN)),
+    ("scan0001.pdf", (None, None, None, filenames.UNKNOWN)),
+    ("", (None, None, None, filenames.UNKNOWN)),
+    ]
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016 CERN.
+
+"""The original implementations, as a reference for the tests and
+`grobid_proceedings.benchmark`.
+"""
+
+from __future__ import absolute_import
+
+import re
+
+from grobid_proceedings import utils
+
+
+# The author name splitting before memoization
+
+def legacy_split_fullname(author, surname_first=True):
+    """Original `utils.split_fullname`."""
+    if not author:
+        return "", ""
+
+    if "collaboration" in author.lower():
+        return author, ""
+
+    if utils.has_numbers(author):
+        # Remove artifacts from superscript commands
+        author = "".join(
+            [char for char in author if not char.isdigit() and char != "@"]
+            ).replace("bullet", "")
+
+    author = author.strip("' ")
+    if "," in author:
+        fullname = [n.strip() for n in author.split(',')]
+    else:
+        fullname = [n.strip() for n in author.split()]
+
+    if surname_first:
+        surname = fullname[0]
+        given_names = " ".join(fullname[1:])
+    else:
+        surname = fullname[-1]
+        given_names = " ".join(fullname[:-1])
+
+    given_names = legacy_handle_initials(given_names)
+
+
+    return surname, given_names
+
+
+def legacy_handle_initials(given_names):
+    """Original `utils.handle_initials`. `split_names > 1` compares a list to
+    an int, which is always True on Python 2, so every name is handled."""
+    split_names = given_names.split()
+    if split_names > 1:
+        initials = []
+        split_names = [i.strip(".") for i in split_names]
+        for name in split_names:
+            if len(name) == 1:
+                initials.append(name + ".")
+            else:
+                initials.append(name)
+        return " ".join(initials)
+    else:
+        return given_names
+
+
+# The file name patterns before `filenames.FILENAME_PATTERN`
+
+LEGACY_PATTERNS = [
+    # Example: Pages_from_C88-01-23_15-24.pdf
+    re.compile(r'^Pages_from_(C\d\d-\d\d-\d\d)[-_](\d+)\-\d+\.pdfa?$'),
+    # Example: Pages_from_C75-03-02_101.pdf
+    re.compile(r'^Pages_from_(C\d\d-\d\d-\d\d?.?\d)[-_](\d+)\.pdfa?$'),
+    # Example: Pages_from_C88-03-06.1_79-89.pdf
+    re.compile(r'^Pages_from_(C\d\d-\d\d-\d\d?.?\d)[-_](\d+)\-\d+\.pdfa?$'),
+    # Example: anything.pdf
+    re.compile(r'(?i)^(.+)\.pdfa?$'),
+    ]
+
+
+def legacy_classify(filename):
+    """Original `parse_filename` loop, returning the groups of the first match."""
+    for file_pattern in LEGACY_PATTERNS:
+        search_result = file_pattern.search(filename)
+        if search_result:
+            return search_result.groups()
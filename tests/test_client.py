@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016 CERN.
+
+"""`client.GrobidClient` retries overload and broken connections, against the
+stub Grobid of `stubserver`.
+"""
+
+from __future__ import absolute_import
+
+import pytest
+
+from grobid_proceedings import client
+from grobid_proceedings.stubserver import DEFAULT_TEI, StubGrobidServer
+
+
+PDF = b"%PDF-1.4 contribution"
+
+
+class FakeResponse(object):
+
+    def __init__(self, headers):
+        self.headers = headers
+
+
+@pytest.fixture
+def stub():
+    server = StubGrobidServer(latency=0).start()
+    yield server
+    server.stop()
+
+
+def make_client(host, retries=2):
+    return client.GrobidClient(host, connect_timeout=1, read_timeout=5,
+                               retries=retries, backoff=0)
+
+
+def test_post_returns_the_tei(stub):
+    stats = {}
+    tei = make_client(stub.url).post(client.FULLTEXT_SERVICE, PDF, stats=stats)
+    assert tei == DEFAULT_TEI
+    assert stats["status_codes"] == [200]
+    assert stats["retries"] == 0
+
+
+def test_overload_is_retried_then_raised(stub):
+    stub.max_concurrency = 0  # Every request is answered with 503
+    stats = {}
+    with pytest.raises(client.GrobidError) as error:
+        make_client(stub.url).post(client.FULLTEXT_SERVICE, PDF, stats=stats)
+    assert error.value.status_code == 503
+    assert stats["status_codes"] == [503, 503, 503]
+    assert stats["retries"] == 2
+    assert stub.requests == 3
+
+
+def test_other_errors_are_not_retried(stub):
+    stats = {}
+    with pytest.raises(client.GrobidError) as error:
+        make_client(stub.url).post("processNothing", PDF, stats=stats)
+    assert error.value.status_code == 404
+    assert stats["status_codes"] == [404]
+
+
+def test_refused_connections_are_retried():
+    server = StubGrobidServer().start()
+    url = server.url
+    server.stop()
+    stats = {}
+    with pytest.raises(client.GrobidError):
+        make_client(url, retries=1).post(client.FULLTEXT_SERVICE, PDF, stats=stats)
+    assert stats["status_codes"] == ["ConnectionError", "ConnectionError"]
+    assert stats["retries"] == 1
+
+
+def test_backoff_doubles_up_to_the_maximum(monkeypatch):
+    monkeypatch.setattr(client.random, "uniform", lambda low, high: high)
+    assert [client.backoff_delay(attempt, 2, 10) for attempt in range(5)] == [
+        2, 4, 8, 10, 10]
+
+
+def test_backoff_honours_retry_after(monkeypatch):
+    monkeypatch.setattr(client.random, "uniform", lambda low, high: high)
+    assert client.backoff_delay(0, 2, 10, FakeResponse({"Retry-After": "30"})) == 30
+    assert client.backoff_delay(2, 2, 10, FakeResponse({"Retry-After": "3"})) == 8
+    assert client.backoff_delay(0, 2, 10, FakeResponse({})) == 2
+
+
+def test_backoff_has_jitter():
+    delays = set(client.backoff_delay(3, 2, 120) for _ in range(20))
+    assert len(delays) > 1
+    assert all(8 <= delay <= 16 for delay in delays)
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016 CERN.
+
+"""`filenames.classify` on the file names found in the upload directories."""
+
+from __future__ import absolute_import
+
+import pytest
+
+from grobid_proceedings import filenames
+from tests import fixtures, legacy
+
+
+@pytest.mark.parametrize("filename, expected", fixtures.FILENAME_FIXTURES)
+def test_classify(filename, expected):
+    assert filenames.classify(filename) == expected
+
+
+@pytest.mark.parametrize("filename, expected", fixtures.FILENAME_FIXTURES)
+def test_classify_like_legacy(filename, expected):
+    groups = legacy.legacy_classify(filename)
+    if expected[0] and groups and len(groups) == 2:
+        assert groups == expected[:2]
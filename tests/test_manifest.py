@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016 CERN.
+
+"""`manifest.Manifest` skips the unchanged pdfs of a resumed run."""
+
+from __future__ import absolute_import
+
+import os
+
+from grobid_proceedings import manifest
+
+
+def make_pdf(folder, name, content=b"%PDF-1.4 contribution"):
+    path = str(folder.join(name))
+    with open(path, "wb") as pfile:
+        pfile.write(content)
+    return path
+
+
+def reopen(output_dir, resume=True):
+    return manifest.Manifest(output_dir, resume=resume)
+
+
+def test_recorded_pdf_is_done_after_resume(tmpdir):
+    output_dir = str(tmpdir.mkdir("out"))
+    pdf_path = make_pdf(tmpdir, "Pages_from_C12-03-10_11.pdf")
+    progress = reopen(output_dir)
+    progress.record(pdf_path, manifest.DONE, pubdate="2012")
+    progress.close()
+
+    progress = reopen(output_dir)
+    assert progress.is_done(pdf_path, pubdate="2012")
+    assert not progress.is_done(pdf_path, pubdate="2013")
+    assert [entry["path"] for entry in progress.done()] == [pdf_path]
+    assert not reopen(output_dir, resume=False).is_done(pdf_path)
+
+
+def test_failed_and_new_pdfs_are_not_done(tmpdir):
+    output_dir = str(tmpdir.mkdir("out"))
+    failed = make_pdf(tmpdir, "Pages_from_C12-03-10_11.pdf")
+    new = make_pdf(tmpdir, "Pages_from_C12-03-10_21.pdf")
+    progress = reopen(output_dir)
+    progress.record(failed, manifest.FAILED)
+    progress.close()
+
+    progress = reopen(output_dir)
+    assert not progress.is_done(failed)
+    assert not progress.is_done(new)
+    assert progress.done() == []
+
+
+def test_modified_pdf_is_not_done(tmpdir):
+    output_dir = str(tmpdir.mkdir("out"))
+    pdf_path = make_pdf(tmpdir, "Pages_from_C12-03-10_11.pdf")
+    progress = reopen(output_dir)
+    progress.record(pdf_path, manifest.DONE)
+    make_pdf(tmpdir, "Pages_from_C12-03-10_11.pdf", b"%PDF-1.4 corrected version")
+    assert not reopen(output_dir).is_done(pdf_path)
+
+
+def test_touched_pdf_is_done_and_not_hashed_again(tmpdir):
+    output_dir = str(tmpdir.mkdir("out"))
+    pdf_path = make_pdf(tmpdir, "Pages_from_C12-03-10_11.pdf")
+    progress = reopen(output_dir)
+    progress.record(pdf_path, manifest.DONE)
+    progress.close()
+    stat = os.stat(pdf_path)
+    os.utime(pdf_path, (stat.st_atime, stat.st_mtime + 60))
+
+    progress = reopen(output_dir)
+    assert progress.is_done(pdf_path)
+    assert progress.entries[pdf_path]["mtime"] == os.stat(pdf_path).st_mtime
+
+
+def test_record_uses_the_stat_of_the_manifest(tmpdir):
+    output_dir = str(tmpdir.mkdir("out"))
+    pdf_path = make_pdf(tmpdir, "Pages_from_C12-03-10_11.pdf")
+    progress = manifest.Manifest(output_dir, stat=lambda path: (21, 1234.5))
+    progress.record(pdf_path, manifest.DONE, sha256="0" * 64)
+    entry = progress.entries[pdf_path]
+    assert (entry["size"], entry["mtime"], entry["sha256"]) == (21, 1234.5, "0" * 64)
+
+
+def test_prune_drops_deleted_pdfs_and_their_records(tmpdir):
+    output_dir = str(tmpdir.mkdir("out"))
+    kept = make_pdf(tmpdir, "Pages_from_C12-03-10_11.pdf")
+    deleted = make_pdf(tmpdir, "Pages_from_C12-03-10_21.pdf")
+    record_path = str(tmpdir.join("out", "C12-03-10_21.xml"))
+    with open(record_path, "w") as xfile:
+        xfile.write("<record/>")
+    progress = reopen(output_dir)
+    progress.record(kept, manifest.DONE)
+    progress.record(deleted, manifest.DONE, record_path)
+    progress.close()
+    os.remove(deleted)
+
+    progress = reopen(output_dir)
+    dropped = progress.prune([kept])
+    assert [entry["path"] for entry in dropped] == [deleted]
+    assert not os.path.exists(record_path)
+    assert progress.prune([kept]) == []
+    progress.close()
+    assert list(reopen(output_dir).entries) == [kept]
+
+
+def test_prune_keeps_shared_outputs(tmpdir):
+    output_dir = str(tmpdir.mkdir("out"))
+    kept = make_pdf(tmpdir, "Pages_from_C12-03-10_11.pdf")
+    deleted = make_pdf(tmpdir, "Pages_from_C12-03-10_21.pdf")
+    collection = str(tmpdir.join("out", "C12-03-10.xml"))
+    with open(collection, "w") as xfile:
+        xfile.write("<collection/>")
+    progress = reopen(output_dir)
+    progress.record(kept, manifest.DONE, collection, marcxml="<record/>")
+    progress.record(deleted, manifest.DONE, collection, marcxml="<record/>")
+
+    assert len(progress.prune([kept])) == 1
+    assert os.path.exists(collection)
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016 CERN.
+
+"""`utils.split_fullname` gives the same names as the original implementation."""
+
+from __future__ import absolute_import
+
+import pytest
+
+from grobid_proceedings import utils
+from tests import fixtures, legacy
+
+
+@pytest.mark.parametrize("surname_first", [True, False])
+@pytest.mark.parametrize("name", fixtures.GOLDEN_NAMES)
+def test_split_fullname_like_legacy(name, surname_first):
+    try:
+        expected = legacy.legacy_split_fullname(name, surname_first)
+    except IndexError:
+        expected = ("", "")  # Nothing left of the name
+    assert utils.split_fullname(name, surname_first) == expected
+
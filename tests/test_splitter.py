@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016 CERN.
+
+"""`splitter.read_ranges` reads the page range files of the proceedings."""
+
+from __future__ import absolute_import
+
+from grobid_proceedings import splitter
+
+
+def test_read_ranges(tmpdir):
+    page_file = tmpdir.join("pageranges.txt")
+    page_file.write_binary(b"\xef\xbb\xbf1-16\r\n17 - 34\r\n\r\n35\r\nfoo\r\n580-end\r\n")
+    assert splitter.read_ranges(str(page_file)) == [
+        (1, 16), (17, 34), (35, 35), (580, None)]
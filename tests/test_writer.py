@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016 CERN.
+
+"""`writer.CollectionWriter` writes the records in order, or nothing."""
+
+from __future__ import absolute_import
+
+import os
+import threading
+
+import pytest
+
+from grobid_proceedings.writer import (
+    COLLECTION_FOOTER,
+    COLLECTION_HEADER,
+    CollectionWriter,
+    )
+
+
+def read(path):
+    with open(path) as xfile:
+        return xfile.read()
+
+
+def test_records_are_written_in_order(tmpdir):
+    path = str(tmpdir.join("C12-03-10.xml"))
+    writer = CollectionWriter(path, ["a", "b", "c"])
+    writer.add("c", "<c/>")
+    writer.add("b", "<b/>")
+    assert writer.written == 0
+    writer.add("a", "<a/>")
+    assert writer.written == 3
+    assert not os.path.exists(path)
+    writer.close()
+    assert read(path) == COLLECTION_HEADER + "<a/><b/><c/>" + COLLECTION_FOOTER
+    assert tmpdir.listdir() == [tmpdir.join("C12-03-10.xml")]
+
+
+def test_close_writes_the_leftover_records(tmpdir):
+    path = str(tmpdir.join("C12-03-10.xml"))
+    with CollectionWriter(path, ["a", "b", "c"]) as writer:
+        writer.add("z", "<z/>")
+        writer.add("c", "<c/>")
+        writer.add("y", "<y/>")
+    assert read(path) == COLLECTION_HEADER + "<c/><y/><z/>" + COLLECTION_FOOTER
+
+
+def test_reserve_blocks_until_a_record_is_written(tmpdir):
+    writer = CollectionWriter(str(tmpdir.join("C12-03-10.xml")), ["a", "b"],
+                              max_pending=1)
+    writer.reserve("a")
+    reserved = threading.Event()
+
+    def reserve_b():
+        writer.reserve("b")
+        reserved.set()
+
+    thread = threading.Thread(target=reserve_b)
+    thread.daemon = True
+    thread.start()
+    reserved.wait(0.2)
+    assert not reserved.is_set()
+    writer.add("a", "<a/>")
+    reserved.wait(5)
+    assert reserved.is_set()
+    writer.add("b", "<b/>")
+    writer.close()
+
+
+def test_abort_leaves_the_target_alone(tmpdir):
+    path = str(tmpdir.join("C12-03-10.xml"))
+    with open(path, "w") as xfile:
+        xfile.write("previous run")
+    with pytest.raises(RuntimeError):
+        with CollectionWriter(path, ["a", "b"]) as writer:
+            writer.add("a", "<a/>")
+            raise RuntimeError("Interrupted")
+    assert read(path) == "previous run"
+    assert tmpdir.listdir() == [tmpdir.join("C12-03-10.xml")]